@@ -1,27 +1,24 @@
 import streamlit as st
 import asyncio
 from login import show_login_page, is_authenticated, get_current_user, logout
-from music import predict_favorite_genre, create_and_compose, get_spotify_playlist
+from music import predict_favorite_genre, create_and_compose, get_spotify_playlist, get_spotify_client, get_job_queue
 from database import get_user_profile, create_initial_user_profile, display_stored_user_data, update_user_mood
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
 import nest_asyncio
 from datetime import datetime
-import pickle
-from pathlib import Path
+from model_registry import get_model
+from prefetch import get_prefetcher
+from playlist_catalog import get_catalog_syncer
 # Apply nest_asyncio to allow nested event loops
 nest_asyncio.apply()
 
 def load_model():
-    """Load the trained XGBoost model."""
+    """Return the shared, read-only handle to the trained XGBoost model.
+
+    The model is loaded and verified once per process by the model registry,
+    so reruns and concurrent sessions reuse the same instance.
+    """
     try:
-        model_path = Path("best_xgb")
-        if not model_path.exists():
-            raise FileNotFoundError("Model file not found. Please ensure best_xgb.pkl is in the project root.")
-        
-        with open(model_path, 'rb') as f:
-            model = pickle.load(f)
-        return model
+        return get_model()
     except Exception as e:
         st.error(f"❌ Error loading model: {str(e)}")
         raise
@@ -33,10 +30,10 @@ def initialize_spotify():
             st.error("❌ Spotify API credentials are missing. Please check your secrets.toml")
             return None
             
-        return spotipy.Spotify(auth_manager=SpotifyClientCredentials(
-            client_id=st.secrets["SPOTIFY_CLIENT_ID"],
-            client_secret=st.secrets["SPOTIFY_CLIENT_SECRET"]
-        ))
+        return get_spotify_client(
+            st.secrets["SPOTIFY_CLIENT_ID"],
+            st.secrets["SPOTIFY_CLIENT_SECRET"]
+        )
     except Exception as e:
         st.error(f"❌ Failed to initialize Spotify client: {str(e)}")
         return None
@@ -183,6 +180,9 @@ async def main():
             st.error("Failed to initialize Spotify client. Please check your credentials.")
             return
 
+        # Keep the local playlist catalog synced in the background
+        get_catalog_syncer(sp_client).start()
+
         # Load the trained model
         model = load_model()
         if not model:
@@ -204,10 +204,14 @@ async def main():
         
         # Store data in session state for other pages
         st.session_state.user_profile = user_profile
-        st.session_state.model = model
         st.session_state.sp_client = sp_client
         st.session_state.user = user
         
+        # Warm the predicted genre's playlists and reserve a track in the background
+        prefetch = st.session_state.get('prefetch')
+        if prefetch is None or prefetch.user_key != user_email:
+            st.session_state.prefetch = get_prefetcher().start(user_email, user_profile, model, sp_client)
+        
         # Add logout button in sidebar with gradient background
         st.sidebar.markdown("""
         <style>
@@ -223,6 +227,14 @@ async def main():
         """, unsafe_allow_html=True)
         
         if st.sidebar.button("🚪 Logout", type="secondary"):
+            prefetch = st.session_state.pop('prefetch', None)
+            if prefetch is not None:
+                prefetch.cancel()
+            # Generation jobs the music page is still following are not needed after logout
+            for key in ('track_job', 'variation_job'):
+                job = st.session_state.pop(key, None)
+                if job is not None:
+                    get_job_queue().cancel(job['id'])
             logout()
             st.rerun()
         
@@ -0,0 +1,133 @@
+# audio_encoding.py
+"""Compress generated audio with ffmpeg while it is still being generated.
+
+StreamingEncoder pipes raw PCM chunks into an ffmpeg process from a worker
+thread, so encoding overlaps with Lyria generation and the compressed file
+is ready moments after the last chunk arrives.
+"""
+
+import os
+import queue
+import threading
+from io import BytesIO
+
+# Output formats: ffmpeg codec and container, plus what the browser needs
+AUDIO_FORMATS = {
+    'opus': {'codec': 'libopus', 'container': 'ogg', 'mime': 'audio/ogg', 'extension': 'ogg'},
+    'mp3': {'codec': 'libmp3lame', 'container': 'mp3', 'mime': 'audio/mpeg', 'extension': 'mp3'},
+    'aac': {'codec': 'aac', 'container': 'adts', 'mime': 'audio/aac', 'extension': 'aac'},
+}
+
+AUDIO_FORMAT = os.environ.get("MUSICREC_AUDIO_FORMAT", "mp3")
+AUDIO_BITRATE = os.environ.get("MUSICREC_AUDIO_BITRATE", "128k")
+
+
+class StreamingEncoder:
+    """Encode a stream of PCM chunks with ffmpeg in the background.
+
+    Args:
+        audio_format (str): One of AUDIO_FORMATS
+        bitrate (str): ffmpeg bitrate, e.g. '96k'
+        sample_rate (int): Input sample rate
+        channels (int): Input channel count
+        input_format (str): 's16le' for raw PCM chunks, 'wav' for a complete WAV file
+    """
+
+    def __init__(self, audio_format=AUDIO_FORMAT, bitrate=AUDIO_BITRATE, sample_rate=48000,
+                 channels=2, input_format='s16le'):
+        if audio_format not in AUDIO_FORMATS:
+            raise ValueError(f"Unsupported audio format: {audio_format}")
+        self.audio_format = audio_format
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.input_format = input_format
+        self._chunks = queue.Queue()
+        self._output = BytesIO()
+        self._errors = BytesIO()
+        self._process = None
+        self._threads = []
+
+    @property
+    def mime(self):
+        return AUDIO_FORMATS[self.audio_format]['mime']
+
+    @property
+    def extension(self):
+        return AUDIO_FORMATS[self.audio_format]['extension']
+
+    def start(self):
+        """Launch ffmpeg and the threads that feed and drain it."""
+        import ffmpeg
+
+        spec = AUDIO_FORMATS[self.audio_format]
+        if self.input_format == 's16le':
+            source = ffmpeg.input('pipe:', format='s16le', ac=self.channels, ar=self.sample_rate)
+        else:
+            source = ffmpeg.input('pipe:', format=self.input_format)
+        self._process = source.output(
+            'pipe:', format=spec['container'], acodec=spec['codec'], audio_bitrate=self.bitrate
+        ).global_args('-hide_banner', '-loglevel', 'error').run_async(
+            pipe_stdin=True, pipe_stdout=True, pipe_stderr=True
+        )
+        self._threads = [
+            threading.Thread(target=self._write, name="ffmpeg-writer", daemon=True),
+            threading.Thread(target=self._drain, args=(self._process.stdout, self._output), daemon=True),
+            threading.Thread(target=self._drain, args=(self._process.stderr, self._errors), daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def _write(self):
+        stdin = self._process.stdin
+        try:
+            while True:
+                chunk = self._chunks.get()
+                if chunk is None:
+                    break
+                stdin.write(chunk)
+        except (BrokenPipeError, OSError):
+            # ffmpeg exited early; finish() reports its error output
+            pass
+        finally:
+            try:
+                stdin.close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _drain(pipe, sink):
+        for block in iter(lambda: pipe.read(1 << 16), b''):
+            sink.write(block)
+
+    def feed(self, chunk):
+        """Queue a chunk for encoding without blocking the caller."""
+        self._chunks.put(bytes(chunk))
+
+    def finish(self, timeout=30):
+        """Flush the input and return the encoded file.
+
+        Raises:
+            RuntimeError: If ffmpeg fails
+        """
+        self._chunks.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        returncode = self._process.wait(timeout)
+        if returncode != 0:
+            message = self._errors.getvalue().decode(errors='replace').strip()
+            raise RuntimeError(f"ffmpeg exited with {returncode}: {message[-500:]}")
+        return self._output.getvalue()
+
+    def cancel(self):
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+        self._chunks.put(None)
+
+
+def encode_audio(data, audio_format=AUDIO_FORMAT, bitrate=AUDIO_BITRATE, input_format='wav'):
+    """Encode a complete track (WAV bytes by default) in one call."""
+    encoder = StreamingEncoder(audio_format, bitrate, input_format=input_format).start()
+    encoder.feed(data)
+    return encoder.finish()
@@ -0,0 +1,212 @@
+# benchmarks/bench_inference.py
+"""Offline benchmarks for the genre-prediction hot path.
+
+Measures cold model load, warm single-profile latency (p50/p99), batch
+throughput and peak memory for music.predict_favorite_genre and
+predict_favorite_genres, using synthetic profiles drawn from the profile
+form's field domains. Results are written as JSON so runs from different
+commits can be compared:
+
+    python benchmarks/bench_inference.py --output before.json
+    python benchmarks/bench_inference.py --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+
+from features import random_profiles  # noqa: E402
+
+BATCH_SIZES = [1, 100, 10_000, 1_000_000]
+# Profiles are generated and scored in chunks so 1M rows fit in memory
+CHUNK_SIZE = 100_000
+
+COLD_LOAD_SCRIPT = """
+import sys, time, json
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+from model_registry import load_model_file
+load_model_file({path!r})
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1e3
+    return {
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p99_ms': float(np.percentile(samples, 99)),
+        'mean_ms': float(samples.mean()),
+        'n': int(len(samples))
+    }
+
+
+def bench_cold_load(model_path, repeats):
+    """Load the model in fresh interpreters, including the xgboost/NumPy import cost."""
+    samples = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_LOAD_SCRIPT.format(root=str(ROOT), path=str(model_path))],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1])["seconds"])
+    return percentiles(samples)
+
+
+def bench_warm_load(model_path, repeats):
+    """Time Home.load_model's registry lookup once the model is resident."""
+    from model_registry import get_model
+
+    get_model(model_path)
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        get_model(model_path)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def bench_single(model, repeats):
+    """Single-profile latency for distinct profiles (cache misses) and a repeated one (hits)."""
+    from music import predict_favorite_genre
+    from prediction_cache import PREDICTION_CACHE
+
+    PREDICTION_CACHE.clear()
+    profiles = list(random_profiles(repeats, seed=1))
+    uncached = []
+    for user_profile in profiles:
+        start = time.perf_counter()
+        predict_favorite_genre(user_profile, model)
+        uncached.append(time.perf_counter() - start)
+
+    cached = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict_favorite_genre(profiles[0], model)
+        cached.append(time.perf_counter() - start)
+    return {'uncached': percentiles(uncached), 'cached': percentiles(cached)}
+
+
+def bench_batch(model, size):
+    """Encode and score `size` profiles in chunks, tracking time split and peak memory.
+
+    Each chunk is scored twice: once untraced for the timings, since
+    tracemalloc slows the Python-side encoder far more than inference,
+    and once under tracemalloc for the peak. Profiles are generated before
+    either pass, so neither covers building the synthetic input.
+    """
+    from music import encode_profiles, predict_encoded
+
+    encode_seconds = predict_seconds = 0.0
+    peak = 0
+    for index, offset in enumerate(range(0, size, CHUNK_SIZE)):
+        chunk = list(random_profiles(min(CHUNK_SIZE, size - offset), seed=[2, index]))
+        start = time.perf_counter()
+        features = encode_profiles(chunk)
+        encode_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        predict_encoded(features, model)
+        predict_seconds += time.perf_counter() - start
+        del features
+
+        tracemalloc.start()
+        predict_encoded(encode_profiles(chunk), model)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        del chunk
+
+    total = encode_seconds + predict_seconds
+    return {
+        'rows': size,
+        'encode_s': encode_seconds,
+        'predict_s': predict_seconds,
+        'rows_per_s': size / total if total else 0.0,
+        'peak_traced_mb': peak / 2**20
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Print per-metric ratios (current / baseline) for timings and throughput."""
+    def flatten(prefix, value, out):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                flatten(f"{prefix}.{key}" if prefix else key, item, out)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[prefix] = value
+        return out
+
+    current = flatten("", results['results'], {})
+    previous = flatten("", baseline['results'], {})
+    for key in sorted(current):
+        if key in previous and previous[key] and key.split('.')[-1] not in ('n', 'rows'):
+            print(f"{key:55s} {previous[key]:>14.4f} -> {current[key]:>14.4f}  ({current[key] / previous[key]:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark genre inference and feature encoding.")
+    parser.add_argument("--model", default=str(ROOT / "best_xgb"), help="Model file to benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=BATCH_SIZES, help="Batch sizes")
+    parser.add_argument("--repeats", type=int, default=1000, help="Single-profile samples")
+    parser.add_argument("--cold-repeats", type=int, default=5, help="Fresh-process model loads")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    parser.add_argument("--compare", help="Baseline JSON results to compare against")
+    args = parser.parse_args()
+
+    from model_registry import get_model
+
+    model = get_model(args.model)
+    results = {
+        'cold_load': bench_cold_load(args.model, args.cold_repeats),
+        'warm_load': bench_warm_load(args.model, args.repeats),
+        'single': bench_single(model, args.repeats),
+        'batch': {str(size): bench_batch(model, size) for size in args.sizes}
+    }
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'model': str(args.model),
+            'model_version': model.version,
+            'model_format': model.format,
+            # ru_maxrss is KiB on Linux
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        },
+        'results': results
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
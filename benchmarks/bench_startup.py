@@ -0,0 +1,102 @@
+# benchmarks/bench_startup.py
+"""Cold-start benchmarks for Home.py and each Streamlit page.
+
+For every script, in fresh interpreters, this measures:
+  - import: time to execute the script's module-level imports
+  - first_run: time for a headless first run (streamlit.testing AppTest),
+    which is what a new session pays before anything renders
+
+    python benchmarks/bench_startup.py --output before.json
+    python benchmarks/bench_startup.py --output after.json --compare before.json
+"""
+
+import argparse
+import ast
+import json
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from bench_inference import ROOT, compare, git_revision, percentiles
+
+SCRIPTS = ["Home.py"] + sorted(str(p.relative_to(ROOT)) for p in (ROOT / "pages").glob("*.py"))
+
+IMPORT_SCRIPT = """
+import sys, time, json
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+{imports}
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+
+FIRST_RUN_SCRIPT = """
+import sys, time, json
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+AppTest.from_file({path!r}, default_timeout={timeout}).run()
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+
+
+def script_imports(path):
+    """Return the source of a script's module-level import statements, in order."""
+    tree = ast.parse(Path(path).read_text())
+    lines = [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return "\n".join(lines) or "pass"
+
+
+def run_fresh(source):
+    output = subprocess.run(
+        [sys.executable, "-c", source], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])["seconds"]
+
+
+def bench_script(path, repeats, timeout):
+    imports = script_imports(ROOT / path)
+    import_samples = [
+        run_fresh(IMPORT_SCRIPT.format(root=str(ROOT), imports=imports)) for _ in range(repeats)
+    ]
+    first_run_samples = [
+        run_fresh(FIRST_RUN_SCRIPT.format(root=str(ROOT), path=str(ROOT / path), timeout=timeout))
+        for _ in range(repeats)
+    ]
+    return {
+        'import': percentiles(import_samples),
+        'first_run': percentiles(first_run_samples)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Streamlit script cold start.")
+    parser.add_argument("--scripts", nargs="+", default=SCRIPTS, help="Scripts relative to the repo root")
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters per script")
+    parser.add_argument("--timeout", type=float, default=30, help="AppTest run timeout in seconds")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    parser.add_argument("--compare", help="Baseline JSON results to compare against")
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': datetime.now().isoformat(),
+            'python': sys.version.split()[0]
+        },
+        'results': {path: bench_script(path, args.repeats, args.timeout) for path in args.scripts}
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU cache with hit/miss counters.
+
+    Instances are meant to live at module level so every Streamlit session
+    in the process shares them.
+
+    With `ttl` (seconds), entries also expire that long after they were
+    stored; an expired entry counts as a miss and is dropped on lookup.
+    put() can override the TTL per entry.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        # key -> (expires_at or None, value)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _live(self, key):
+        # Caller holds the lock
+        expires_at, _ = self._data[key]
+        if expires_at is not None and self._clock() >= expires_at:
+            del self._data[key]
+            self.expirations += 1
+            return False
+        return True
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data and self._live(key):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key][1]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (self._clock() + ttl if ttl is not None else None, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key in self._data and self._live(key):
+                return self._data.pop(key)[1]
+            return default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data and self._live(key)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Return a snapshot of the cache counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -1,14 +1,41 @@
 # database.py
 
 import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import lru_cache
 import json
 import os
+import threading
+from collections import OrderedDict
+from cache import LRUCache
+
+# Profiles are cached process-wide so reruns don't re-read Firestore
+PROFILE_TTL = int(os.environ.get("MUSICREC_PROFILE_TTL", 300))
+# A missing profile is usually created moments later, so remember it only briefly
+MISSING_PROFILE_TTL = 30
+PROFILE_CACHE = LRUCache(maxsize=4096, ttl=PROFILE_TTL)
+_NOT_CACHED = object()
+
+# Optionally listen to Firestore snapshots to pick up changes made elsewhere
+WATCH_PROFILES = os.environ.get("MUSICREC_PROFILE_WATCH", "0") == "1"
+MAX_PROFILE_WATCHES = 256
+_profile_watches = OrderedDict()
+_watch_lock = threading.Lock()
+
+# Mood history: every entry is appended to users/<email>/mood_history, and
+# per-field sums are kept in users/<email>/mood_daily/<YYYY-MM-DD> and
+# users/<email>/mood_weekly/<Monday's date> so trends never scan the history
+MOOD_FIELDS = ('Anxiety', 'Depression', 'Insomnia', 'OCD')
+ROLLUP_COLLECTIONS = {'day': 'mood_daily', 'week': 'mood_weekly'}
+# Firestore allows 500 writes per batch; each entry writes 3 documents
+ENTRIES_PER_BATCH = 150
+ROLLUP_CACHE = LRUCache(maxsize=1024, ttl=300)
 
 def initialize_firestore():
     """Initialize Firestore with credentials from Streamlit secrets."""
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
     try:
         if not firebase_admin._apps:
             # Get Firebase config from Streamlit secrets
@@ -55,27 +82,69 @@ def initialize_firestore():
         st.error(f"Failed to initialize Firestore: {str(e)}")
         st.stop()  # Stop execution if Firebase can't be initialized
 
-# Initialize Firestore
-try:
-    db = initialize_firestore()
-except Exception as e:
-    st.error(f"Critical error initializing database: {str(e)}")
-    raise
+@lru_cache(maxsize=1)
+def get_db():
+    """Return the Firestore client, initializing Firebase on first use."""
+    try:
+        return initialize_firestore()
+    except Exception as e:
+        st.error(f"Critical error initializing database: {str(e)}")
+        raise
+
+def _cache_profile(user_email, profile):
+    PROFILE_CACHE.put(user_email, profile, ttl=None if profile is not None else MISSING_PROFILE_TTL)
+
+def _on_profile_snapshot(docs, changes, read_time):
+    # Runs on a Firestore listener thread: apply changes made by other
+    # processes or the console
+    for doc in docs:
+        profile = doc.to_dict() if doc.exists else None
+        cached = PROFILE_CACHE.get(doc.id, _NOT_CACHED)
+        if cached is _NOT_CACHED:
+            continue
+        changed = {key for key in set(profile or {}) | set(cached or {})
+                   if (profile or {}).get(key) != (cached or {}).get(key)}
+        if changed:
+            _cache_profile(doc.id, profile)
+
+def _watch_profile(doc_ref, user_email):
+    """Listen for changes to a cached profile, keeping at most MAX_PROFILE_WATCHES listeners."""
+    with _watch_lock:
+        if user_email in _profile_watches:
+            _profile_watches.move_to_end(user_email)
+            return
+        _profile_watches[user_email] = doc_ref.on_snapshot(_on_profile_snapshot)
+        while len(_profile_watches) > MAX_PROFILE_WATCHES:
+            _, watch = _profile_watches.popitem(last=False)
+            watch.unsubscribe()
 
-def get_user_profile(user_email):
-    """Retrieve user profile from Firestore."""
+def get_user_profile(user_email, use_cache=True):
+    """Retrieve user profile, reading through the process-wide profile cache.
+    
+    Returns a copy, so callers can modify it freely.
+    """
+    if use_cache:
+        cached = PROFILE_CACHE.get(user_email, _NOT_CACHED)
+        if cached is not _NOT_CACHED:
+            return dict(cached) if cached is not None else None
     try:
-        doc_ref = db.collection('users').document(user_email)
+        doc_ref = get_db().collection('users').document(user_email)
         doc = doc_ref.get()
-        return doc.to_dict() if doc.exists else None
+        profile = doc.to_dict() if doc.exists else None
+        _cache_profile(user_email, profile)
+        if WATCH_PROFILES:
+            _watch_profile(doc_ref, user_email)
+        return dict(profile) if profile is not None else None
     except Exception as e:
         st.error(f"Error fetching user profile: {e}")
         return None
 
 def save_user_profile(user_email, user_data):
     try:
-        doc_ref = db.collection('users').document(user_email)
+        doc_ref = get_db().collection('users').document(user_email)
         doc_ref.set(user_data)
+        # Write through, so the next read needs no round trip
+        _cache_profile(user_email, dict(user_data))
         return True
     except Exception as e:
         st.error(f"Error saving user profile: {e}")
@@ -92,14 +161,122 @@ def update_user_mood(user_email, mood_data):
         bool: True if update was successful, False otherwise
     """
     try:
+        db = get_db()
         doc_ref = db.collection('users').document(user_email)
+        # The profile update, history entry and rollups commit together in one batch
+        batch = db.batch()
         # Use set with merge=True to create or update the document
-        doc_ref.set(mood_data, merge=True)
+        batch.set(doc_ref, mood_data, merge=True)
+        if any(field in mood_data for field in MOOD_FIELDS):
+            _add_mood_entry(batch, doc_ref, mood_data, datetime.now())
+        batch.commit()
+        _invalidate_rollups(user_email)
+        cached = PROFILE_CACHE.get(user_email)
+        if cached is not None:
+            _cache_profile(user_email, {**cached, **mood_data})
+        else:
+            # Only part of the document is known; read it afresh next time
+            PROFILE_CACHE.pop(user_email)
         return True
     except Exception as e:
         st.error(f"Error updating mood data: {str(e)}")
         return False
 
+def profile_cache_stats():
+    return PROFILE_CACHE.stats()
+
+def _period_starts(timestamp):
+    day = timestamp.date()
+    return {'day': day.isoformat(), 'week': (day - timedelta(days=day.weekday())).isoformat()}
+
+def _add_mood_entry(batch, user_ref, mood_data, timestamp):
+    """Queue one history entry plus increments to its day and week rollups on a write batch."""
+    from google.cloud.firestore import Increment
+
+    values = {field: float(mood_data[field]) for field in MOOD_FIELDS if field in mood_data}
+    batch.set(user_ref.collection('mood_history').document(), {'timestamp': timestamp, **values})
+    for period, start in _period_starts(timestamp).items():
+        # Increments need no read, so concurrent entries never conflict
+        rollup = {'start': start, 'updated': timestamp}
+        for field, value in values.items():
+            rollup[f'count_{field}'] = Increment(1)
+            rollup[f'sum_{field}'] = Increment(value)
+            rollup[f'sumsq_{field}'] = Increment(value * value)
+        batch.set(user_ref.collection(ROLLUP_COLLECTIONS[period]).document(start), rollup, merge=True)
+
+def record_moods(user_email, entries):
+    """Append many mood entries, e.g. when importing history.
+    
+    Args:
+        user_email (str): The email of the user
+        entries (list): (datetime, mood dict) pairs
+        
+    Returns:
+        int: Number of entries written
+    """
+    db = get_db()
+    user_ref = db.collection('users').document(user_email)
+    written = 0
+    for i in range(0, len(entries), ENTRIES_PER_BATCH):
+        batch = db.batch()
+        for timestamp, mood_data in entries[i:i + ENTRIES_PER_BATCH]:
+            _add_mood_entry(batch, user_ref, mood_data, timestamp)
+        batch.commit()
+        written += len(entries[i:i + ENTRIES_PER_BATCH])
+    _invalidate_rollups(user_email)
+    return written
+
+def _invalidate_rollups(user_email):
+    for period in ROLLUP_COLLECTIONS:
+        ROLLUP_CACHE.pop((user_email, period))
+
+def get_mood_rollups(user_email, period='day'):
+    """Return a user's mood rollups as a DataFrame indexed by period start.
+    
+    Columns are mean_<field>, std_<field> and count_<field> for every mood
+    field, computed from the stored sums without touching mood_history.
+    """
+    import numpy as np
+    import pandas as pd
+
+    key = (user_email, period)
+    frame = ROLLUP_CACHE.get(key)
+    if frame is None:
+        docs = get_db().collection('users').document(user_email).collection(ROLLUP_COLLECTIONS[period]).stream()
+        frame = pd.DataFrame([doc.to_dict() for doc in docs])
+        if not frame.empty:
+            frame = frame.set_index(pd.to_datetime(frame['start'])).sort_index()
+        ROLLUP_CACHE.put(key, frame)
+
+    stats = pd.DataFrame(index=frame.index)
+    for field in MOOD_FIELDS:
+        if f'count_{field}' not in frame:
+            continue
+        count = frame[f'count_{field}'].astype(float)
+        mean = frame[f'sum_{field}'] / count
+        variance = (frame[f'sumsq_{field}'] / count - mean ** 2).clip(lower=0)
+        stats[f'mean_{field}'] = mean
+        stats[f'std_{field}'] = np.sqrt(variance)
+        stats[f'count_{field}'] = count
+    return stats
+
+def mood_trends(rollups, period='day', window=7):
+    """Rolling mean of each mood field over `window` periods, with empty periods left as gaps.
+    
+    Returns:
+        DataFrame: One column per mood field, indexed by period start
+    """
+    import pandas as pd
+
+    means = rollups[[column for column in rollups if column.startswith('mean_')]]
+    means.columns = [column[len('mean_'):] for column in means.columns]
+    if means.empty:
+        return means
+    # Put every period on the axis so the window spans calendar time, not entries
+    freq = 'D' if period == 'day' else 'W-MON'
+    means = means.reindex(pd.date_range(means.index.min(), means.index.max(), freq=freq))
+    return means.rolling(window, min_periods=1).mean()
+
 def show_user_profile_form():
     """Display a form to collect user profile information with categorical options."""
     with st.form("user_profile_form"):
@@ -0,0 +1,226 @@
+# features.py
+
+from collections import namedtuple
+
+import numpy as np
+
+# A model input column. Numeric features try each alias in order and fall back
+# to the default; flag features compare the lower-cased value to a token.
+Feature = namedtuple("Feature", ["name", "aliases", "kind", "default", "token"])
+
+
+def numeric(name, *aliases, default):
+    return Feature(name, aliases or (name,), "numeric", float(default), None)
+
+
+def flag(name, token="yes"):
+    return Feature(name, (name,), "flag", 0.0, token)
+
+
+# Categorical strings accepted by numeric features (yes/no and listening frequency)
+CATEGORY_VALUES = {
+    'yes': 1.0,
+    'no': 0.0,
+    'never': 0.0,
+    'rarely': 1.0,
+    'sometimes': 2.0,
+    'very frequently': 3.0
+}
+
+# Column order must match the order the model was trained with
+FEATURE_SCHEMA = (
+    numeric('Age', default=25),
+    numeric('Hours per day', default=2),
+    flag('While working'),
+    flag('Instrumentalist'),
+    flag('Composer'),
+    flag('Exploratory'),
+    flag('Foreign languages'),
+    numeric('BPM', default=120),
+    # Handle both Frequency_Genre and Frequency [Genre] formats
+    numeric('Frequency_Classical', 'Frequency_Classical', 'Frequency [Classical]', default=2),
+    numeric('Frequency_EDM', 'Frequency_EDM', 'Frequency [EDM]', default=2),
+    numeric('Frequency_Folk', 'Frequency_Folk', 'Frequency [Folk]', default=2),
+    numeric('Frequency_Gospel', 'Frequency_Gospel', 'Frequency [Gospel]', default=2),
+    numeric('Frequency_HipHop', 'Frequency_HipHop', 'Frequency [Hip hop]', default=2),
+    numeric('Frequency_Jazz', 'Frequency_Jazz', 'Frequency [Jazz]', default=2),
+    numeric('Frequency_KPop', 'Frequency_KPop', 'Frequency [K pop]', default=2),
+    numeric('Frequency_Metal', 'Frequency_Metal', 'Frequency [Metal]', default=2),
+    numeric('Frequency_Pop', 'Frequency_Pop', 'Frequency [Pop]', default=2),
+    numeric('Frequency_RnB', 'Frequency_RnB', 'Frequency [R&B]', default=2),
+    numeric('Frequency_Rock', 'Frequency_Rock', 'Frequency [Rock]', default=2),
+    numeric('Frequency_VGM', 'Frequency_VGM', 'Frequency [Video game music]', default=2),
+    numeric('Anxiety', default=5),
+    numeric('Depression', default=5),
+    numeric('Insomnia', default=5),
+    numeric('OCD', default=5),
+    flag('MusicEffects', token='improve'),
+)
+
+_MISSING = object()
+
+
+def _to_number(value):
+    """Convert a stored profile value to float, or _MISSING if it has no numeric meaning.
+
+    NaN counts as missing, as it does for a DataFrame cell in encode_frame,
+    so a profile encodes the same whether it comes from JSONL or Parquet.
+    """
+    value_type = type(value)
+    if value_type is float or value_type is int:
+        return float(value) if value == value else _MISSING
+    text = value if value_type is str else str(value)
+    number = CATEGORY_VALUES.get(text.lower())
+    if number is not None:
+        return number
+    try:
+        number = float(text)
+    except ValueError:
+        return _MISSING
+    return number if number == number else _MISSING
+
+
+class FeatureEncoder:
+    """Encoder compiled once from a feature schema.
+
+    Encodes profile dicts row by row, or a pandas DataFrame column by column,
+    into float32 matrices in schema order.
+    """
+
+    def __init__(self, schema=FEATURE_SCHEMA):
+        self.schema = tuple(schema)
+        self.names = [feature.name for feature in self.schema]
+        self._numeric = tuple(
+            (index, feature.aliases, feature.default)
+            for index, feature in enumerate(self.schema) if feature.kind == "numeric"
+        )
+        self._flags = tuple(
+            (index, feature.aliases[0], feature.token)
+            for index, feature in enumerate(self.schema) if feature.kind == "flag"
+        )
+
+    @property
+    def num_features(self):
+        return len(self.schema)
+
+    def encode_into(self, user_profile, out):
+        """Write one profile's features into a preallocated row."""
+        get = user_profile.get
+        for index, aliases, default in self._numeric:
+            number = default
+            for key in aliases:
+                value = get(key)
+                if value is None:
+                    continue
+                converted = _to_number(value)
+                if converted is not _MISSING:
+                    number = converted
+                    break
+            out[index] = number
+        for index, key, token in self._flags:
+            value = get(key, 'No')
+            text = value if type(value) is str else str(value)
+            out[index] = 1.0 if text.lower() == token else 0.0
+        return out
+
+    def encode(self, profiles):
+        """Encode an iterable of profile dicts into an (N, num_features) float32 matrix."""
+        if not isinstance(profiles, (list, tuple)):
+            profiles = list(profiles)
+        features = np.empty((len(profiles), self.num_features), dtype=np.float32)
+        for row, user_profile in enumerate(profiles):
+            self.encode_into(user_profile, features[row])
+        return features
+
+    def encode_one(self, user_profile):
+        """Encode a single profile into a (1, num_features) float32 matrix."""
+        features = np.empty((1, self.num_features), dtype=np.float32)
+        self.encode_into(user_profile, features[0])
+        return features
+
+    def encode_frame(self, frame):
+        """Encode a pandas DataFrame of profiles column-wise.
+
+        Missing cells (NaN/None) are treated like absent keys, so an alias
+        column only supplies a value where it is populated.
+        """
+        import pandas as pd
+
+        features = np.empty((len(frame), self.num_features), dtype=np.float32)
+        for index, feature in enumerate(self.schema):
+            if feature.kind == "flag":
+                if feature.aliases[0] in frame:
+                    column = frame[feature.aliases[0]]
+                    text = column.astype(str).str.lower().where(column.notna(), 'no')
+                    features[:, index] = (text == feature.token).to_numpy(dtype=np.float32)
+                else:
+                    features[:, index] = 0.0
+                continue
+
+            values = np.full(len(frame), np.nan)
+            for key in feature.aliases:
+                if key not in frame:
+                    continue
+                converted = self._numeric_column(frame[key], pd)
+                values = np.where(np.isnan(values), converted, values)
+            features[:, index] = np.where(np.isnan(values), feature.default, values)
+        return features
+
+    @staticmethod
+    def _numeric_column(column, pd):
+        if column.dtype == bool:
+            return np.full(len(column), np.nan)
+        if pd.api.types.is_numeric_dtype(column):
+            return column.to_numpy(dtype=np.float64)
+        text = column.astype(str).str.lower()
+        categories = text.map(CATEGORY_VALUES)
+        numbers = pd.to_numeric(column.where(column.map(type) != bool), errors='coerce')
+        converted = categories.fillna(numbers).where(column.notna())
+        return converted.to_numpy(dtype=np.float64)
+
+
+FEATURE_ENCODER = FeatureEncoder()
+NUM_FEATURES = FEATURE_ENCODER.num_features
+
+
+# Value domains of the profile form fields (database.show_user_profile_form)
+YES_NO_OPTIONS = ['Yes', 'No']
+FREQUENCY_OPTIONS = ['Never', 'Rarely', 'Sometimes', 'Very frequently']
+FREQUENCY_FIELDS = [
+    'Frequency_Classical', 'Frequency_EDM', 'Frequency_Folk', 'Frequency_Gospel',
+    'Frequency_HipHop', 'Frequency_Jazz', 'Frequency_KPop', 'Frequency_Metal',
+    'Frequency_Pop', 'Frequency_RnB', 'Frequency_Rock', 'Frequency_VGM'
+]
+
+
+def random_profiles(n, seed=0):
+    """Generate n synthetic profile dicts drawn from the profile form's field domains."""
+    rng = np.random.default_rng(seed)
+    ages = rng.integers(5, 121, n)
+    hours = rng.integers(0, 25, n)
+    bpms = rng.integers(60, 201, n)
+    moods = rng.integers(1, 11, (n, 4))
+    frequencies = rng.integers(0, len(FREQUENCY_OPTIONS), (n, len(FREQUENCY_FIELDS)))
+    yes_no = rng.integers(0, 2, (n, 7))
+    effects = rng.integers(0, 2, n)
+
+    for i in range(n):
+        profile = {
+            'Age': int(ages[i]),
+            'Hours per day': int(hours[i]),
+            'While working': YES_NO_OPTIONS[yes_no[i, 0]],
+            'Instrumentalist': YES_NO_OPTIONS[yes_no[i, 1]],
+            'Composer': YES_NO_OPTIONS[yes_no[i, 2]],
+            'Exploratory': int(yes_no[i, 3]),
+            'ForeignLanguages': int(yes_no[i, 4]),
+            'MusicEffects': 'Improve' if effects[i] else 'Not',
+            'BPM': int(bpms[i]),
+            'Openness': int(yes_no[i, 5]),
+            'Anxiety': int(moods[i, 0]),
+            'Depression': int(moods[i, 1]),
+            'Insomnia': int(moods[i, 2]),
+            'OCD': int(moods[i, 3])
+        }
+        for j, field in enumerate(FREQUENCY_FIELDS):
+            profile[field] = FREQUENCY_OPTIONS[frequencies[i, j]]
+        yield profile
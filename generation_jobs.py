@@ -0,0 +1,439 @@
+# generation_jobs.py
+"""Background queue for Lyria generation jobs, run by local worker processes.
+
+Pages submit a job and get its ID back straight away, then poll status()
+on later reruns instead of holding the Streamlit script thread for the
+whole generation.
+
+Admission control:
+  - at most `workers` jobs run at once across all users (global limit)
+  - at most `per_user` jobs run at once for any one user
+  - at most `max_queued_per_user` jobs may wait per user; more are rejected
+Among runnable jobs, the lowest priority number goes first, then the user
+with the fewest running jobs, then submission order, so a user with a
+burst of jobs cannot starve everyone else.
+
+Every job gets a spool directory shared with its worker process. The
+worker appends audio there as it arrives (or publishes each finished part
+of a batch), so a page can start playback while the job is still running. Cancelling a running
+job drops a flag file there, and the worker stops generating within
+CANCEL_POLL seconds, which frees its slot.
+"""
+
+import asyncio
+import itertools
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+GENERATION_WORKERS = int(os.environ.get("MUSICREC_GENERATION_WORKERS", 4))
+PER_USER_LIMIT = int(os.environ.get("MUSICREC_GENERATION_PER_USER", 2))
+MAX_QUEUED_PER_USER = int(os.environ.get("MUSICREC_GENERATION_MAX_QUEUED", 8))
+SPOOL_DIR = Path(os.environ.get("MUSICREC_GENERATION_SPOOL", Path(tempfile.gettempdir()) / "musicrec_jobs"))
+# Seconds between a worker's checks for a cancel request
+CANCEL_POLL = 0.2
+# Finished jobs are kept this long for the page to collect their result
+RESULT_TTL = 600
+
+# Priorities: lower runs first
+INTERACTIVE = 0
+BATCH = 1
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    """Raised when a user already has the maximum number of queued jobs."""
+
+
+class Spool:
+    """Directory shared by a job's worker process and the pages following it."""
+
+    AUDIO = "audio.pcm"
+    CANCEL = "cancel"
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def create(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        return self
+
+    def remove(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def cancel(self):
+        """Ask the worker to stop."""
+        try:
+            (self.path / self.CANCEL).touch()
+        except FileNotFoundError:
+            pass
+
+    @property
+    def cancelled(self):
+        return (self.path / self.CANCEL).exists()
+
+    def audio_writer(self):
+        """Open the PCM spool for appending; unbuffered, so readers see each chunk once written."""
+        return open(self.path / self.AUDIO, 'ab', buffering=0)
+
+    def audio_bytes(self):
+        try:
+            return (self.path / self.AUDIO).stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def put_part(self, index, result):
+        """Publish one finished part of a batch job."""
+        tmp = self.path / f".part-{index}.tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump(result, f)
+        os.replace(tmp, self.path / f"part-{index}.pkl")
+
+    def parts(self, skip=()):
+        """Return index -> result for every published part not in `skip`."""
+        parts = {}
+        for path in self.path.glob("part-*.pkl"):
+            index = int(path.stem.split('-')[1])
+            if index in skip:
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    parts[index] = pickle.load(f)
+            except FileNotFoundError:
+                pass
+        return parts
+
+    def read_audio(self, frame_size=4):
+        """Return the PCM spooled so far, trimmed to whole frames (16-bit stereo by default)."""
+        try:
+            data = (self.path / self.AUDIO).read_bytes()
+        except FileNotFoundError:
+            return b''
+        return data[:len(data) - len(data) % frame_size]
+
+    async def watch(self, task):
+        """Cancel `task` once a cancel request shows up; run alongside the generation."""
+        while not self.cancelled:
+            await asyncio.sleep(CANCEL_POLL)
+        task.cancel()
+
+
+def run_cancellable(spool, coro):
+    """Run a worker coroutine until it finishes or the job is cancelled (then return None)."""
+    async def run():
+        watcher = asyncio.create_task(spool.watch(asyncio.current_task()))
+        try:
+            return await coro
+        finally:
+            watcher.cancel()
+
+    try:
+        return asyncio.run(run())
+    except asyncio.CancelledError:
+        return None
+
+
+class Job:
+    def __init__(self, user, args, priority, seq, run):
+        self.id = uuid.uuid4().hex[:12]
+        self.user = user
+        self.args = args
+        self.run = run
+        self.priority = priority
+        self.seq = seq
+        self.state = QUEUED
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.future = None
+        self.spool = None
+
+
+def _init_worker(api_key):
+    # Worker processes have no Streamlit session to read secrets from
+    if api_key:
+        os.environ.setdefault("LYRIA_API_KEY", api_key)
+
+
+def generate_track(spool, prompts, duration_seconds, seed=None):
+    """Run one generation in a worker process.
+
+    Audio is spooled for pages following the job and compressed while it
+    streams in.
+
+    Returns:
+        dict: 'wav' bytes, 'compressed' bytes or None, 'audio_format' and 'metrics',
+        or None if the job was cancelled
+    """
+    from audio_encoding import AUDIO_FORMAT, StreamingEncoder
+    from music import TrackBuffer, stream_prompts
+
+    async def run():
+        track = TrackBuffer(duration_seconds)
+        metrics = {}
+        try:
+            encoder = StreamingEncoder().start()
+        except Exception:
+            encoder = None
+        try:
+            try:
+                with spool.audio_writer() as audio:
+                    async for chunk in stream_prompts(prompts, duration_seconds, metrics, seed=seed):
+                        track.append(chunk)
+                        audio.write(chunk)
+                        if encoder is not None:
+                            encoder.feed(chunk)
+            except TimeoutError:
+                # Keep what arrived before the deadline
+                if not track.pcm_bytes:
+                    raise
+                metrics['timed_out'] = True
+            if not track.pcm_bytes:
+                raise RuntimeError("No audio received from Lyria")
+        except BaseException:
+            if encoder is not None:
+                encoder.cancel()
+            raise
+        compressed = None
+        if encoder is not None:
+            try:
+                compressed = encoder.finish()
+            except Exception:
+                pass
+        return {'wav': track.getvalue(), 'compressed': compressed, 'audio_format': AUDIO_FORMAT, 'metrics': metrics}
+
+    return run_cancellable(spool, run())
+
+
+def generate_variation_batch(spool, variations, duration_seconds):
+    """Generate a batch of variations concurrently in one worker process.
+
+    The variations share the worker's Lyria session pool, so the batch takes
+    about as long as one track. Each variation is compressed and published
+    to the spool as soon as it finishes.
+
+    Returns:
+        list: One dict per variation, in order: 'wav', 'compressed' and
+        'audio_format', or 'error'; None if the job was cancelled
+    """
+    from audio_encoding import AUDIO_FORMAT, encode_audio
+    from music import generate_variations
+
+    def compress(wav):
+        try:
+            return encode_audio(wav)
+        except Exception:
+            return None
+
+    async def run():
+        results = [None] * len(variations)
+        async for variation, track, error in generate_variations(variations, duration_seconds):
+            index = next(i for i, v in enumerate(variations) if v is variation)
+            if track is None:
+                result = {'error': error}
+            else:
+                wav = track.getvalue()
+                compressed = await asyncio.to_thread(compress, wav)
+                result = {'wav': wav, 'compressed': compressed, 'audio_format': AUDIO_FORMAT, 'error': None}
+            spool.put_part(index, result)
+            results[index] = result
+        return results
+
+    return run_cancellable(spool, run())
+
+
+class JobQueue:
+    """Priority queue of generation jobs with global and per-user concurrency limits.
+
+    Args:
+        run: Picklable function executed in a worker process with the job's
+            Spool followed by its args
+        workers (int): Worker processes, which is also the global running limit
+        per_user (int): Running jobs allowed per user
+        max_queued_per_user (int): Waiting jobs allowed per user
+        initargs (tuple): Arguments for the worker initializer
+        spool_dir (Path): Where per-job spool directories are created
+    """
+
+    def __init__(self, run=generate_track, workers=GENERATION_WORKERS, per_user=PER_USER_LIMIT,
+                 max_queued_per_user=MAX_QUEUED_PER_USER, result_ttl=RESULT_TTL, initargs=(None,),
+                 spool_dir=SPOOL_DIR):
+        self.run = run
+        self.spool_dir = Path(spool_dir)
+        self.workers = workers
+        self.per_user = per_user
+        self.max_queued_per_user = max_queued_per_user
+        self.result_ttl = result_ttl
+        self.initargs = initargs
+        # Re-entrant: a done callback can run inside _dispatch if a job finishes instantly
+        self._lock = threading.RLock()
+        self._jobs = {}
+        self._pending = []
+        self._running = {}
+        self._seq = itertools.count()
+        self._executor = None
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _pool(self):
+        if self._executor is None:
+            # Spawned, not forked: the Streamlit server process is multi-threaded
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=self.initargs
+            )
+        return self._executor
+
+    def submit(self, user, *args, priority=INTERACTIVE, run=None):
+        """Queue a job and return its ID without waiting for it to run.
+
+        `run` overrides the queue's worker function for this job (e.g.
+        generate_variation_batch); a batch counts as one job toward the limits.
+
+        Raises:
+            QueueFull: If the user already has max_queued_per_user waiting jobs
+        """
+        with self._lock:
+            self._expire()
+            if sum(1 for job in self._pending if job.user == user) >= self.max_queued_per_user:
+                self.rejected += 1
+                raise QueueFull(f"Too many queued generation jobs (limit {self.max_queued_per_user})")
+            job = Job(user, args, priority, next(self._seq), run or self.run)
+            job.spool = Spool(self.spool_dir / job.id).create()
+            self._jobs[job.id] = job
+            self._pending.append(job)
+            self._dispatch()
+            return job.id
+
+    def _order(self, job):
+        return (job.priority, self._running.get(job.user, 0), job.seq)
+
+    def _dispatch(self):
+        # Caller holds the lock
+        while self._pending and sum(self._running.values()) < self.workers:
+            runnable = [job for job in self._pending if self._running.get(job.user, 0) < self.per_user]
+            if not runnable:
+                return
+            job = min(runnable, key=self._order)
+            self._pending.remove(job)
+            self._running[job.user] = self._running.get(job.user, 0) + 1
+            job.state = RUNNING
+            job.started_at = time.monotonic()
+            try:
+                job.future = self._pool().submit(job.run, job.spool, *job.args)
+            except BrokenProcessPool:
+                # A worker died; start a fresh pool for this and later jobs
+                self._executor = None
+                job.future = self._pool().submit(job.run, job.spool, *job.args)
+            job.future.add_done_callback(lambda future, job=job: self._finish(job, future))
+
+    def _finish(self, job, future):
+        with self._lock:
+            self._running[job.user] -= 1
+            if not self._running[job.user]:
+                del self._running[job.user]
+            job.finished_at = time.monotonic()
+            if job.state == CANCELLED:
+                pass
+            elif future.cancelled():
+                job.state = CANCELLED
+            elif future.exception() is not None:
+                job.state = FAILED
+                job.error = str(future.exception()) or type(future.exception()).__name__
+                self.failed += 1
+                if isinstance(future.exception(), BrokenProcessPool):
+                    self._executor = None
+            else:
+                job.state = DONE
+                job.result = future.result()
+                self.completed += 1
+            self._dispatch()
+
+    def _expire(self):
+        now = time.monotonic()
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at is not None and now - job.finished_at > self.result_ttl]:
+            self._jobs.pop(job_id).spool.remove()
+
+    def status(self, job_id):
+        """Return a dict describing a job, or None if it is unknown or expired.
+
+        Keys: 'id', 'state', 'position' (jobs ahead of it while queued),
+        'elapsed' seconds, 'error', 'spool' (partial output while running),
+        and 'result' once done.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            now = time.monotonic()
+            position = None
+            if job.state == QUEUED:
+                position = sum(1 for other in self._pending if self._order(other) < self._order(job))
+            return {
+                'id': job.id,
+                'state': job.state,
+                'position': position,
+                'elapsed': (job.finished_at or now) - job.submitted_at,
+                'error': job.error,
+                'spool': job.spool,
+                'result': job.result
+            }
+
+    def cancel(self, job_id):
+        """Cancel a job. A queued job never runs; a running job's worker stops generating.
+
+        A running job keeps its slot until the worker has actually stopped.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state in FINISHED:
+                return False
+            if job.state == QUEUED:
+                self._pending.remove(job)
+                job.finished_at = time.monotonic()
+            else:
+                job.spool.cancel()
+            job.state = CANCELLED
+            return True
+
+    def shutdown(self):
+        with self._lock:
+            for job in self._pending:
+                job.state = CANCELLED
+                job.finished_at = time.monotonic()
+            self._pending.clear()
+            for job in self._jobs.values():
+                if job.state == RUNNING:
+                    job.spool.cancel()
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'running': sum(self._running.values()),
+                'queued': len(self._pending),
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected
+            }
@@ -0,0 +1,260 @@
+# lyria_pool.py
+"""Pool of warm, reusable Lyria RealTime music sessions.
+
+Opening a Lyria session costs a WebSocket handshake plus setup before any
+audio arrives. The pool keeps up to `max_size` sessions open and switches
+prompts on a reused session with set_weighted_prompts.
+
+Streamlit runs each asyncio.run() on a fresh event loop, and a WebSocket
+cannot outlive its loop, so the pool owns a long-lived loop on a daemon
+thread. stream() can be awaited from any loop; audio chunks are handed
+back to the caller's loop as they arrive.
+
+Each session has a reader task that moves messages into a queue. When a
+request ends, playback is stopped, queued audio is dropped and the session
+goes back to the idle list. Sessions are closed when they exceed `max_age`,
+sit idle longer than `idle_timeout`, or their reader has died. A janitor
+task checks idle sessions every `health_interval` seconds.
+
+`connect` is any zero-argument callable returning an async context manager
+that yields a session, so the pool can run against a local stand-in
+WebSocket server (see music.get_client and MUSICREC_LYRIA_BASE_URL).
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+_END = object()
+
+
+class PooledSession:
+    """An open Lyria session plus the reader task that buffers its messages."""
+
+    def __init__(self, context, session):
+        self.context = context
+        self.session = session
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+        self.messages = asyncio.Queue()
+        self.reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        try:
+            while True:
+                received = False
+                async for message in self.session.receive():
+                    received = True
+                    self.messages.put_nowait(message)
+                if not received:
+                    raise ConnectionError("Lyria session closed")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.messages.put_nowait(e)
+
+    @property
+    def alive(self):
+        return not self.reader.done()
+
+    def drain(self):
+        """Drop buffered messages left over from a previous request."""
+        while not self.messages.empty():
+            self.messages.get_nowait()
+
+    async def close(self):
+        self.reader.cancel()
+        try:
+            await self.context.__aexit__(None, None, None)
+        except Exception:
+            pass
+
+
+class LyriaSessionPool:
+    """Bounded pool of warm Lyria sessions with health checks, idle timeout and max age."""
+
+    def __init__(self, connect, max_size=4, idle_timeout=120.0, max_age=900.0,
+                 health_interval=30.0, stop_timeout=2.0):
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self.health_interval = health_interval
+        self.stop_timeout = stop_timeout
+        self._loop = None
+        self._start_lock = threading.Lock()
+        self._idle = deque()
+        self._slots = None
+        self.created = 0
+        self.reused = 0
+        self.closed = 0
+
+    # --- pool loop -----------------------------------------------------
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None:
+                ready = threading.Event()
+
+                def run():
+                    self._loop = asyncio.new_event_loop()
+                    asyncio.set_event_loop(self._loop)
+                    self._slots = asyncio.Semaphore(self.max_size)
+                    self._loop.create_task(self._janitor())
+                    ready.set()
+                    self._loop.run_forever()
+
+                threading.Thread(target=run, name="lyria-session-pool", daemon=True).start()
+                ready.wait()
+        return self._loop
+
+    def _healthy(self, pooled, now):
+        return (
+            pooled.alive
+            and now - pooled.created_at < self.max_age
+            and now - pooled.last_used < self.idle_timeout
+        )
+
+    async def _janitor(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            now = time.monotonic()
+            for pooled in list(self._idle):
+                if not self._healthy(pooled, now):
+                    self._idle.remove(pooled)
+                    await self._close(pooled)
+
+    async def _close(self, pooled):
+        self.closed += 1
+        await pooled.close()
+
+    async def _acquire(self):
+        now = time.monotonic()
+        while self._idle:
+            pooled = self._idle.pop()
+            if self._healthy(pooled, now):
+                self.reused += 1
+                return pooled
+            await self._close(pooled)
+        context = self._connect()
+        session = await context.__aenter__()
+        self.created += 1
+        return PooledSession(context, session)
+
+    async def _release(self, pooled, reusable):
+        if reusable and pooled.alive:
+            try:
+                await asyncio.wait_for(pooled.session.stop(), self.stop_timeout)
+                pooled.drain()
+                pooled.last_used = time.monotonic()
+                if self._healthy(pooled, pooled.last_used):
+                    self._idle.append(pooled)
+                    return
+            except Exception:
+                pass
+        await self._close(pooled)
+
+    async def _produce(self, prompts, config, deliver, state, metrics):
+        try:
+            async with self._slots:
+                started = time.monotonic()
+                pooled = await self._acquire()
+                reusable = False
+                try:
+                    pooled.uses += 1
+                    pooled.drain()
+                    await pooled.session.set_weighted_prompts(prompts=prompts)
+                    if config is not None:
+                        await pooled.session.set_music_generation_config(config=config)
+                    await pooled.session.play()
+                    # Written before any audio is delivered, so the caller sees it with the first chunk
+                    metrics['connect_time'] = time.monotonic() - started
+                    metrics['session_reused'] = pooled.uses > 1
+                    while True:
+                        message = await pooled.messages.get()
+                        if isinstance(message, Exception):
+                            raise message
+                        content = getattr(message, 'server_content', None)
+                        for chunk in (content.audio_chunks or []) if content else []:
+                            deliver(chunk.data)
+                except asyncio.CancelledError:
+                    # The caller has all the audio it wants; the session is still good
+                    # unless the caller gave up on it (e.g. it stalled past a deadline)
+                    reusable = state['reusable']
+                    raise
+                finally:
+                    await self._release(pooled, reusable)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            deliver(e)
+        finally:
+            deliver(_END)
+
+    # --- caller side ---------------------------------------------------
+
+    async def stream(self, prompts, config=None, metrics=None):
+        """Play `prompts` on a pooled session and yield raw PCM chunks.
+
+        Lyria streams until told to stop, so the caller ends the request by
+        closing this generator (break + aclose()); the session is then
+        stopped and returned to the pool. If the generator is instead ended
+        by an exception or cancellation (e.g. a missed deadline), the
+        session is closed rather than reused.
+
+        `metrics` optionally receives 'connect_time' (seconds to get a
+        session and start playback) and 'session_reused'.
+        """
+        pool_loop = self._ensure_loop()
+        caller_loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def deliver(item):
+            try:
+                caller_loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # The caller's loop has already finished
+                pass
+
+        state = {'reusable': True}
+        metrics = {} if metrics is None else metrics
+        future = asyncio.run_coroutine_threadsafe(
+            self._produce(prompts, config, deliver, state, metrics), pool_loop
+        )
+        try:
+            while True:
+                item = await queue.get()
+                if item is _END:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        except GeneratorExit:
+            raise
+        except BaseException:
+            state['reusable'] = False
+            raise
+        finally:
+            future.cancel()
+
+    def close_all(self):
+        """Close every idle session (e.g. on shutdown or after a credentials change)."""
+        if self._loop is None:
+            return
+
+        async def close_idle():
+            while self._idle:
+                await self._close(self._idle.pop())
+
+        asyncio.run_coroutine_threadsafe(close_idle(), self._loop).result()
+
+    def stats(self):
+        return {
+            'max_size': self.max_size,
+            'idle': len(self._idle),
+            'created': self.created,
+            'reused': self.reused,
+            'closed': self.closed
+        }
@@ -0,0 +1,170 @@
+# model_registry.py
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+from pathlib import Path
+
+# Set MUSICREC_MODEL_PATH=best_xgb.trees.npz to serve with the NumPy evaluator
+MODEL_PATH = Path(os.environ.get("MUSICREC_MODEL_PATH", "best_xgb"))
+
+# Native XGBoost booster formats, chosen by file suffix. Anything else is
+# treated as the legacy pickled XGBClassifier.
+NATIVE_FORMATS = {".json": "json", ".ubj": "ubj"}
+
+# Flattened trees exported by tree_ensemble.py, evaluated without xgboost
+TREES_SUFFIX = ".npz"
+
+_models = {}
+_lock = threading.Lock()
+
+
+class ModelHandle:
+    """Read-only handle to a loaded genre model, shared by every session in the process."""
+
+    __slots__ = ("_model", "path", "format", "sha256", "xgboost_version")
+
+    def __init__(self, model, path, model_format, sha256, xgboost_version):
+        object.__setattr__(self, "_model", model)
+        object.__setattr__(self, "path", str(path))
+        object.__setattr__(self, "format", model_format)
+        object.__setattr__(self, "sha256", sha256)
+        object.__setattr__(self, "xgboost_version", xgboost_version)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ModelHandle is read-only")
+
+    @property
+    def version(self):
+        """Short identifier of the model contents, stable across processes."""
+        return self.sha256[:12]
+
+    def predict(self, features):
+        return self._model.predict(features)
+
+    def predict_proba(self, features):
+        return self._model.predict_proba(features)
+
+    def get_booster(self):
+        return self._model.get_booster()
+
+    def __repr__(self):
+        return f"ModelHandle(path={self.path!r}, format={self.format!r}, version={self.version!r})"
+
+
+def manifest_path(path):
+    """Return the sidecar manifest path for a model file (e.g. best_xgb.manifest.json)."""
+    path = Path(path)
+    return path.with_name(path.name + ".manifest.json")
+
+
+def file_sha256(path, chunk_size=1 << 16):
+    """Compute the SHA-256 of a file without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _version_tuple(version):
+    parts = []
+    for part in str(version).split('.')[:3]:
+        digits = ''.join(ch for ch in part if ch.isdigit())
+        parts.append(int(digits) if digits else 0)
+    return tuple(parts)
+
+
+def _read_manifest(path):
+    mpath = manifest_path(path)
+    if not mpath.exists():
+        return {}
+    with open(mpath) as f:
+        return json.load(f)
+
+
+def _saved_version(path, model_format, manifest):
+    """Return the XGBoost version the model was saved with, if known."""
+    if manifest.get("xgboost_version"):
+        return manifest["xgboost_version"]
+    if model_format == "json":
+        with open(path) as f:
+            version = json.load(f).get("version")
+        if version:
+            return '.'.join(str(v) for v in version)
+    return None
+
+
+def _check_versions(saved_version, installed_version):
+    """Refuse to load a model saved by a newer XGBoost major version than the installed one."""
+    if not saved_version:
+        return
+    if _version_tuple(installed_version)[0] < _version_tuple(saved_version)[0]:
+        raise ValueError(
+            f"Model was saved with xgboost {saved_version} but xgboost {installed_version} is installed."
+        )
+
+
+def load_model_file(path=MODEL_PATH):
+    """Load and verify a model file, returning a new ModelHandle.
+
+    Args:
+        path (str | Path): Pickled XGBClassifier, a native .json/.ubj booster,
+            or an .npz of trees exported by tree_ensemble.py
+
+    Returns:
+        ModelHandle: Read-only handle to the loaded model
+
+    Raises:
+        FileNotFoundError: If the model file does not exist
+        ValueError: If the checksum or XGBoost version check fails
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"Model file not found: {path}. Please ensure it is in the project root.")
+
+    manifest = _read_manifest(path)
+    sha256 = file_sha256(path)
+    expected = manifest.get("sha256")
+    if expected and expected != sha256:
+        raise ValueError(f"Checksum mismatch for {path}: expected {expected}, got {sha256}")
+
+    if path.suffix.lower() == TREES_SUFFIX:
+        from tree_ensemble import TreeEnsemble
+        return ModelHandle(TreeEnsemble.load(path), path, "trees", sha256, None)
+
+    import xgboost as xgb
+
+    model_format = NATIVE_FORMATS.get(path.suffix.lower(), "pickle")
+    _check_versions(_saved_version(path, model_format, manifest), xgb.__version__)
+
+    if model_format == "pickle":
+        with open(path, 'rb') as f:
+            model = pickle.load(f)
+    else:
+        model = xgb.XGBClassifier()
+        model.load_model(str(path))
+
+    return ModelHandle(model, path, model_format, sha256, xgb.__version__)
+
+
+def get_model(path=MODEL_PATH):
+    """Return the shared model handle for a path, loading it once per process."""
+    key = str(Path(path).resolve())
+    handle = _models.get(key)
+    if handle is not None:
+        return handle
+    with _lock:
+        handle = _models.get(key)
+        if handle is None:
+            handle = load_model_file(path)
+            _models[key] = handle
+    return handle
+
+
+def clear_models():
+    """Drop all loaded models so the next get_model() reloads from disk."""
+    with _lock:
+        _models.clear()
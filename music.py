@@ -2,33 +2,88 @@
 
 import asyncio
 import os
-import wave
+import struct
+import tempfile
 import streamlit as st
 import random
 import numpy as np
 from io import BytesIO
 from datetime import datetime, timedelta
+from contextlib import contextmanager
+from functools import lru_cache
 import time
-import nest_asyncio
-from google import genai
-from google.genai import types
+from features import FEATURE_ENCODER
+from prediction_cache import prediction_key, get_prediction, put_prediction
+from spotify_cache import search_playlists
+from playlist_catalog import get_catalog
+from playlist_ranking import rank_playlists
 
-# Allow asyncio to run nested within Streamlit
-nest_asyncio.apply()
-
-# Load Lyria API key from Streamlit secrets
-API_KEY = st.secrets.get("LYRIA_API_KEY")
 MODEL_ID = "models/lyria-v1"
+LYRIA_MODEL = "models/lyria-realtime-exp"
+
+# Lyria RealTime streams 16-bit stereo PCM at 48 kHz
+SAMPLE_RATE = 48000
+CHANNELS = 2
+SAMPLE_WIDTH = 2
+
+# Seconds to wait for the first audio chunk before giving up on a session
+FIRST_CHUNK_TIMEOUT = float(os.environ.get("MUSICREC_LYRIA_FIRST_CHUNK_TIMEOUT", 15))
+
+# Catalog playlists compared per BPM-ranked Spotify playlist request
+RANK_CANDIDATES = 8
+
+def get_api_key():
+    """Return the Lyria API key from Streamlit secrets or the environment, or None if it is not configured."""
+    try:
+        api_key = st.secrets.get("LYRIA_API_KEY")
+    except Exception:
+        api_key = None
+    # Generation worker processes get the key through the environment
+    return api_key or os.environ.get("LYRIA_API_KEY")
 
-if not API_KEY:
-    st.error("❌ Lyria API key is not configured. Please check your secrets.toml file.")
+@lru_cache(maxsize=1)
+def get_client():
+    """Create the Lyria (google-genai) client on first use and reuse it afterwards."""
+    import nest_asyncio
+    from google import genai
 
+    # Allow asyncio to run nested within Streamlit
+    nest_asyncio.apply()
 
+    api_key = get_api_key()
+    if not api_key:
+        st.error("❌ Lyria API key is not configured. Please check your secrets.toml file.")
 
-client = genai.Client(
-    api_key=API_KEY, 
-    http_options={'api_version': 'v1alpha'} # REQUIRED for Lyria
-)
+    http_options = {'api_version': 'v1alpha'} # REQUIRED for Lyria
+    # Point the client at a local stand-in server, e.g. for testing the session pool
+    if os.environ.get("MUSICREC_LYRIA_BASE_URL"):
+        http_options['base_url'] = os.environ["MUSICREC_LYRIA_BASE_URL"]
+
+    return genai.Client(
+        api_key=api_key, 
+        http_options=http_options
+    )
+
+@lru_cache(maxsize=1)
+def get_session_pool():
+    """Return the process-wide pool of warm Lyria sessions."""
+    from lyria_pool import LyriaSessionPool
+
+    return LyriaSessionPool(
+        lambda: get_client().aio.live.music.connect(model=LYRIA_MODEL),
+        max_size=int(os.environ.get("MUSICREC_LYRIA_POOL_SIZE", 4))
+    )
+
+@lru_cache(maxsize=4)
+def get_spotify_client(client_id, client_secret):
+    """Create a Spotify client for a set of credentials on first use and reuse it afterwards.
+    
+    The client is non-blocking and keeps a pooled, keep-alive connection and
+    a cached access token that every session shares.
+    """
+    from spotify_client import AsyncSpotifyClient
+
+    return AsyncSpotifyClient(client_id, client_secret)
 
 # Genre mapping and prompts
 GENRE_MAPPING = [
@@ -46,164 +101,437 @@ GENRE_PROMPTS = {
     "Video game music": "Compose an adventurous and dynamic theme suitable for an action-packed video game level."
 }
 
+def encode_profiles(profiles):
+    """Encode user profiles into a single (N, 25) float32 feature matrix."""
+    return FEATURE_ENCODER.encode(profiles)
+
+def _genres_from_indices(indices):
+    # Clamp to a valid index, as for single-profile predictions
+    last = len(GENRE_MAPPING) - 1
+    return [GENRE_MAPPING[max(0, min(int(index), last))] for index in indices]
+
+def predict_encoded(features, model):
+    """Score an already-encoded (N, 25) float32 feature matrix with a single model call.
+    
+    Returns:
+        tuple: (genres, probabilities), as for predict_favorite_genres
+    """
+    if len(features) == 0:
+        return [], np.empty((0, len(GENRE_MAPPING)), dtype=np.float32)
+    
+    if hasattr(model, 'predict_proba'):
+        probabilities = np.asarray(model.predict_proba(features))
+        indices = probabilities.argmax(axis=1)
+    else:
+        probabilities = None
+        indices = np.asarray(model.predict(features)).reshape(-1)
+    
+    return _genres_from_indices(indices), probabilities
+
+def predict_favorite_genres(profiles, model):
+    """Predict favorite genres for many user profiles with a single model call.
+    
+    Args:
+        profiles (iterable): User profile dicts, as stored in Firestore
+        model: Model (or registry handle) exposing predict and optionally predict_proba
+        
+    Returns:
+        tuple: (genres, probabilities) where genres is a list of genre names and
+            probabilities is an (N, n_classes) float array, or None if the model
+            has no predict_proba
+    """
+    return predict_encoded(encode_profiles(profiles), model)
+
 def predict_favorite_genre(user_profile, model):
-    """Predict the favorite music genre based on user profile using the provided model."""
+    """Predict the favorite music genre based on user profile using the provided model.
+    
+    Predictions are memoized process-wide by a fingerprint of the encoded
+    features and the model version, so reruns with an unchanged profile skip
+    inference.
+    
+    Args:
+        user_profile (dict): The user's stored profile
+        model: Model (or registry handle) used for scoring
+    """
     try:
-        # Helper function to safely get and convert values to float32
-        def get_feature(key, default=0):
-            value = user_profile.get(key, default)
-            
-            # Handle None values
-            if value is None:
-                return float(default)
-                
-            # Convert to string for consistent handling
-            if not isinstance(value, str):
-                value = str(value)
-                
-            # Convert string numbers to float
-            if value.replace('.', '').isdigit():
-                return float(value)
-                
-            # Handle yes/no fields
-            if value.lower() in ['yes', 'no']:
-                return 1.0 if value.lower() == 'yes' else 0.0
-                
-            # Handle frequency strings (Never, Rarely, Sometimes, Very frequently)
-            freq_map = {
-                'never': 0.0,
-                'rarely': 1.0,
-                'sometimes': 2.0,
-                'very frequently': 3.0
-            }
-            if value.lower() in freq_map:
-                return freq_map[value.lower()]
-                
-            # Default case - try to convert to float, fallback to default
-            try:
-                return float(value)
-            except (ValueError, TypeError):
-                return float(default)
-        
-        # Prepare the input features for the model
-        input_features = [
-            float(get_feature('Age', 25)),
-            float(get_feature('Hours per day', 2)),
-            float(1 if str(user_profile.get('While working', 'No')).lower() == 'yes' else 0),
-            float(1 if str(user_profile.get('Instrumentalist', 'No')).lower() == 'yes' else 0),
-            float(1 if str(user_profile.get('Composer', 'No')).lower() == 'yes' else 0),
-            float(1 if str(user_profile.get('Exploratory', 'No')).lower() == 'yes' else 0),
-            float(1 if str(user_profile.get('Foreign languages', 'No')).lower() == 'yes' else 0),
-            float(get_feature('BPM', 120)),
-            # Handle both Frequency_Genre and Frequency [Genre] formats
-            float(get_feature('Frequency_Classical', get_feature('Frequency [Classical]', 2))),
-            float(get_feature('Frequency_EDM', get_feature('Frequency [EDM]', 2))),
-            float(get_feature('Frequency_Folk', get_feature('Frequency [Folk]', 2))),
-            float(get_feature('Frequency_Gospel', get_feature('Frequency [Gospel]', 2))),
-            float(get_feature('Frequency_HipHop', get_feature('Frequency [Hip hop]', 2))),
-            float(get_feature('Frequency_Jazz', get_feature('Frequency [Jazz]', 2))),
-            float(get_feature('Frequency_KPop', get_feature('Frequency [K pop]', 2))),
-            float(get_feature('Frequency_Metal', get_feature('Frequency [Metal]', 2))),
-            float(get_feature('Frequency_Pop', get_feature('Frequency [Pop]', 2))),
-            float(get_feature('Frequency_RnB', get_feature('Frequency [R&B]', 2))),
-            float(get_feature('Frequency_Rock', get_feature('Frequency [Rock]', 2))),
-            float(get_feature('Frequency_VGM', get_feature('Frequency [Video game music]', 2))),
-            float(get_feature('Anxiety', 5)),
-            float(get_feature('Depression', 5)),
-            float(get_feature('Insomnia', 5)),
-            float(get_feature('OCD', 5)),
-            float(1 if str(user_profile.get('MusicEffects', 'No')).lower() == 'improve' else 0)
-        ]
-        
-        # Ensure all features are float32 and in a 2D numpy array
-        import numpy as np
-        input_array = np.array([input_features], dtype=np.float32)
+        features = FEATURE_ENCODER.encode_one(user_profile)
+        key = prediction_key(features, model)
+        genre = get_prediction(key)
+        if genre is None:
+            genres, _ = predict_encoded(features, model)
+            genre = genres[0] if genres else GENRE_MAPPING[0]
+            put_prediction(key, genre)
+        return genre
         
-        # Get prediction from the model
-        prediction = model.predict(input_array)
-        
-        # Ensure prediction is an integer index
-        index = int(prediction[0]) if len(prediction) > 0 else 0
-        index = max(0, min(index, len(GENRE_MAPPING) - 1))  # Ensure valid index
+    except Exception:
+        return "Pop"
+
+class TrackBuffer:
+    """In-memory WAV track for a single request.
+    
+    The buffer is preallocated for the expected duration with the WAV header
+    written up front, and PCM chunks are copied in through a memoryview.
+    Playback and download share the bytes returned by getvalue().
+    """
+    
+    HEADER_SIZE = 44
+    
+    def __init__(self, duration_seconds=10, sample_rate=SAMPLE_RATE, channels=CHANNELS, sample_width=SAMPLE_WIDTH):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        capacity = int(duration_seconds * sample_rate) * channels * sample_width
+        self._buffer = bytearray(self.HEADER_SIZE + capacity)
+        self._view = memoryview(self._buffer)
+        self._size = self.HEADER_SIZE
+        self._value = None
+        self._write_header()
+    
+    def _write_header(self):
+        data_size = self._size - self.HEADER_SIZE
+        block_align = self.channels * self.sample_width
+        struct.pack_into(
+            '<4sI4s4sIHHIIHH4sI', self._view, 0,
+            b'RIFF', 36 + data_size, b'WAVE', b'fmt ', 16, 1, self.channels, self.sample_rate,
+            self.sample_rate * block_align, block_align, 8 * self.sample_width, b'data', data_size
+        )
+    
+    def append(self, chunk):
+        """Append a PCM chunk, growing the buffer only if generation overruns the estimate."""
+        end = self._size + len(chunk)
+        if end > len(self._buffer):
+            self._view.release()
+            self._buffer.extend(bytes(max(end - len(self._buffer), len(self._buffer) // 2)))
+            self._view = memoryview(self._buffer)
+        self._view[self._size:end] = chunk
+        self._size = end
+        self._value = None
+    
+    @property
+    def pcm_bytes(self):
+        return self._size - self.HEADER_SIZE
+    
+    @property
+    def frames(self):
+        return self.pcm_bytes // (self.channels * self.sample_width)
+    
+    @property
+    def duration_seconds(self):
+        return self.frames / self.sample_rate
+    
+    @contextmanager
+    def view(self):
+        """Yield a zero-copy memoryview of the complete WAV file written so far.
         
-        predicted_genre = GENRE_MAPPING[index]
+        The view is released when the with block exits. A view still held
+        elsewhere would pin the buffer, and an append that has to grow it
+        would then fail with BufferError, so use getvalue() to keep the bytes.
+        """
+        self._write_header()
+        with self._view[:self._size] as view:
+            yield view
+    
+    def getvalue(self):
+        """Return the WAV file as bytes, copied once and reused until more audio is appended."""
+        if self._value is None:
+            with self.view() as view:
+                self._value = bytes(view)
+        return self._value
+    
+    def spill(self, directory=None, prefix="track_"):
+        """Write the track to a uniquely named temp file and return its path."""
+        with tempfile.NamedTemporaryFile(dir=directory, prefix=prefix, suffix=".wav", delete=False) as f:
+            with self.view() as view:
+                f.write(view)
+            return f.name
+    
+    def __len__(self):
+        return self._size
+
+async def stream_prompts(weighted_prompts, duration_seconds=10, metrics=None, seed=None,
+                         timeout=None, first_chunk_timeout=FIRST_CHUNK_TIMEOUT):
+    """Stream raw PCM chunks for a blend of prompts from a pooled Lyria session.
+    
+    Frames are counted as they arrive and the last chunk is trimmed, so the
+    output is exactly `duration_seconds` long whatever the chunk size. A
+    frame split across two messages is held back until it is complete.
+    
+    Args:
+        weighted_prompts (list): (prompt text, weight) pairs
+        duration_seconds (float): Track length
+        metrics (dict): Optional dict that receives per-phase timings in seconds:
+            'connect_time', 'time_to_first_audio', 'total_time', plus 'frames',
+            'audio_seconds' and 'steady_rate' (audio seconds per second after
+            the first chunk)
+        seed (int): Optional generation seed, so variations of one prompt differ
+        timeout (float): Overall deadline in seconds (default: duration plus
+            first_chunk_timeout, with slack for slower than real-time generation)
+        first_chunk_timeout (float): Deadline in seconds for the first chunk
         
-        return predicted_genre
+    Yields:
+        bytes: 16-bit stereo 48 kHz PCM chunks, in order
         
-    except Exception:
-        return "Pop"
+    Raises:
+        TimeoutError: If a deadline passes; the stalled session is closed, not reused
+    """
+    from google.genai import types
+
+    metrics = {} if metrics is None else metrics
+    timeout = first_chunk_timeout + 2 * duration_seconds if timeout is None else timeout
+    frame_size = CHANNELS * SAMPLE_WIDTH
+    target_bytes = int(duration_seconds * SAMPLE_RATE) * frame_size
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + timeout
+    first_deadline = min(deadline, started + first_chunk_timeout)
+    first_chunk_at = None
+    received = 0
+    pending = b''
 
-async def generate_genre_track(genre_name, duration_seconds=10):
-    """ACTUALLY generates audio using Lyria RealTime."""
+    # Play the prompt on a warm pooled session instead of a fresh WebSocket
+    chunks = get_session_pool().stream(
+        prompts=[types.WeightedPrompt(text=text, weight=weight) for text, weight in weighted_prompts],
+        config=types.LiveMusicGenerationConfig(seed=seed) if seed is not None else None,
+        metrics=metrics
+    )
+    try:
+        while received < target_bytes:
+            phase_deadline = deadline if first_chunk_at is not None else first_deadline
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), max(phase_deadline - loop.time(), 0))
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                if first_chunk_at is None:
+                    raise TimeoutError(f"No audio from Lyria within {first_chunk_timeout:.0f}s")
+                raise TimeoutError(
+                    f"Lyria produced {received / frame_size / SAMPLE_RATE:.1f}s of "
+                    f"{duration_seconds}s within {timeout:.0f}s"
+                )
+            if first_chunk_at is None:
+                first_chunk_at = loop.time()
+                metrics['time_to_first_audio'] = first_chunk_at - started
+            # Only whole frames go out; a partial frame waits for the rest of
+            # its bytes in the next message, so later samples stay aligned
+            if pending:
+                chunk = pending + chunk
+            whole = min(len(chunk) - len(chunk) % frame_size, target_bytes - received)
+            chunk, pending = chunk[:whole], chunk[whole:]
+            if not chunk:
+                continue
+            received += len(chunk)
+            yield chunk
+    finally:
+        # Stops playback and hands the session back to the pool; runs on
+        # timeouts and when Streamlit stops the script because the user left
+        await chunks.aclose()
+        finished = loop.time()
+        metrics['total_time'] = finished - started
+        metrics['frames'] = received // frame_size
+        metrics['audio_seconds'] = metrics['frames'] / SAMPLE_RATE
+        if first_chunk_at is not None and finished > first_chunk_at:
+            metrics['steady_rate'] = metrics['audio_seconds'] / (finished - first_chunk_at)
+
+async def stream_genre_track(genre_name, duration_seconds=10, metrics=None, timeout=None):
+    """Stream raw PCM chunks from Lyria RealTime while the track is being generated.
+    
+    Args:
+        genre_name (str): One of the GENRE_PROMPTS keys
+        duration_seconds (float): Exact track length
+        metrics (dict): Optional dict that receives per-phase timings (see stream_prompts)
+        timeout (float): Overall deadline in seconds (see stream_prompts)
+            
+    Yields:
+        bytes: 16-bit stereo 48 kHz PCM chunks, in order
+    """
     prompt_text = GENRE_PROMPTS.get(genre_name)
     if not prompt_text:
         st.error(f"Genre {genre_name} not found.")
-        return None
+        return
 
-    filename = f"{genre_name.replace(' ', '_')}_track.wav"
-    
+    chunks = stream_prompts([(prompt_text, 1.0)], duration_seconds, metrics, timeout=timeout)
     try:
-        # We save the stream to a local file so Streamlit can play it
-        with wave.open(filename, 'wb') as wf:
-            wf.setnchannels(2)      # Stereo
-            wf.setsampwidth(2)      # 16-bit
-            wf.setframerate(48000)  # 48kHz
-
-            # Connect to the Lyria WebSocket
-            async with client.aio.live.music.connect(model='models/lyria-realtime-exp') as session:
-                st.write(f"🎵 Connected to Lyria. Composing {genre_name}...")
-                
-                # Set the prompt
-                await session.set_weighted_prompts(
-                    prompts=[types.WeightedPrompt(text=prompt_text, weight=1.0)]
-                )
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        await chunks.aclose()
+
+async def render_genre_track(genre_name, duration_seconds=10):
+    """Generate a complete track and return it as WAV bytes (None if nothing was received)."""
+    track = TrackBuffer(duration_seconds)
+    async for chunk in stream_genre_track(genre_name, duration_seconds):
+        track.append(chunk)
+    return track.getvalue() if track.pcm_bytes else None
+
+@lru_cache(maxsize=1)
+def get_track_pool():
+    """Return the process-wide pool of pre-generated tracks per genre."""
+    from audio_encoding import AUDIO_FORMAT, encode_audio
+    from track_cache import TrackCache, TrackPoolWarmer
+    from track_features import TrackAnalyzer, TrackFeatureIndex
+
+    # Pooled tracks are compressed when generated, so serving one needs no ffmpeg run
+    return TrackPoolWarmer(
+        TrackCache(version=LYRIA_MODEL), GENRE_PROMPTS, render_genre_track,
+        analyzer=TrackAnalyzer(TrackFeatureIndex()), encode=encode_audio, encoded_format=AUDIO_FORMAT
+    )
 
-                # Start playback
-                await session.play()
+@lru_cache(maxsize=1)
+def get_job_queue():
+    """Return the process-wide queue of background generation jobs."""
+    from generation_jobs import JobQueue
 
-                chunks_needed = duration_seconds // 2 # ~2 seconds per chunk
-                count = 0
+    return JobQueue(initargs=(get_api_key(),))
 
-                async for message in session.receive():
-                    if message.server_content.audio_chunks:
-                        # Write raw PCM data to the wav file
-                        wf.writeframes(message.server_content.audio_chunks[0].data)
-                        count += 1
-                    
-                    if count >= chunks_needed:
-                        break
+async def generate_genre_track(genre_name, duration_seconds=10, spill_to_file=False):
+    """ACTUALLY generates audio using Lyria RealTime.
+    
+    Args:
+        genre_name (str): One of the GENRE_PROMPTS keys
+        duration_seconds (float): Exact track length
+        spill_to_file (bool): Also write the track to a uniquely named temp file
+        
+    Returns:
+        TrackBuffer | str: The in-memory track, or the temp file path if
+            spill_to_file is set; None on failure
+    """
+    if genre_name not in GENRE_PROMPTS:
+        st.error(f"Genre {genre_name} not found.")
+        return None
+
+    track = TrackBuffer(duration_seconds)
+    
+    try:
+        connected = False
+        async for chunk in stream_genre_track(genre_name, duration_seconds):
+            if not connected:
+                st.write(f"🎵 Connected to Lyria. Composing {genre_name}...")
+                connected = True
+            track.append(chunk)
         
-        return filename
+        if not track.pcm_bytes:
+            return None
+        if spill_to_file:
+            return track.spill(prefix=f"{genre_name.replace(' ', '_')}_")
+        return track
 
     except Exception as e:
         st.error(f"❌ Lyria Connection Error: {str(e)}")
         return None
 
-async def get_spotify_playlist(genre, sp_client=None):
+def rank_genres(user_profile, model):
+    """Return (genre, probability) pairs for a profile, most likely first."""
+    genres, probabilities = predict_favorite_genres([user_profile], model)
+    if probabilities is None:
+        return [(genres[0], 1.0)]
+    row = probabilities[0]
+    order = np.argsort(row)[::-1]
+    return [(GENRE_MAPPING[i], float(row[i])) for i in order if i < len(GENRE_MAPPING)]
+
+def plan_variations(ranked_genres, count=3, base_seed=None):
+    """Build `count` distinct variations from the predicted genre and its runners-up.
+    
+    Variations alternate between the top genre with a fresh seed, blends of
+    the top genre with a runner-up weighted by their probabilities, and
+    runners-up on their own.
+    
+    Returns:
+        list: dicts with 'label', 'prompts' ((text, weight) pairs) and 'seed'
+    """
+    base_seed = random.randrange(2**31) if base_seed is None else base_seed
+    top, top_prob = ranked_genres[0]
+    runners_up = [(g, p) for g, p in ranked_genres[1:] if g in GENRE_PROMPTS]
+    plans = [{'label': top, 'prompts': [(GENRE_PROMPTS[top], 1.0)]}]
+    for genre, prob in runners_up:
+        total = (top_prob + prob) or 1.0
+        plans.append({
+            'label': f"{top} × {genre}",
+            'prompts': [(GENRE_PROMPTS[top], top_prob / total), (GENRE_PROMPTS[genre], prob / total)]
+        })
+        plans.append({'label': genre, 'prompts': [(GENRE_PROMPTS[genre], 1.0)]})
+    # Fill any remaining slots with reseeded takes on the top genre
+    while len(plans) < count:
+        plans.append({'label': f"{top} (take {len(plans) + 1})", 'prompts': [(GENRE_PROMPTS[top], 1.0)]})
+    variations = plans[:count]
+    for i, variation in enumerate(variations):
+        variation['seed'] = (base_seed + i) % 2**31
+    return variations
+
+async def generate_variations(variations, duration_seconds=10):
+    """Generate several variations concurrently and yield each as soon as it is done.
+    
+    Concurrency is capped process-wide by the Lyria session pool size, so a
+    burst of variation requests cannot open unbounded streams.
+    
+    Yields:
+        tuple: (variation, TrackBuffer or None, error message or None), in completion order
+    """
+    async def render(variation):
+        try:
+            track = TrackBuffer(duration_seconds)
+            async for chunk in stream_prompts(variation['prompts'], duration_seconds, seed=variation['seed']):
+                track.append(chunk)
+            if not track.pcm_bytes:
+                return variation, None, "No audio received"
+            return variation, track, None
+        except Exception as e:
+            return variation, None, str(e)
+
+    tasks = [asyncio.ensure_future(render(variation)) for variation in variations]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def get_spotify_playlist(genre, sp_client=None, bpm=None, metrics=None):
     """Fetch a random Spotify playlist for the given genre.
     
+    Playlists come from the local catalog (see playlist_catalog), weighted by
+    popularity; Spotify is only searched for a genre that was never synced.
+    
     Args:
         genre (str): The music genre to search for
         sp_client: Optional Spotify client instance. If not provided, will try to initialize one.
+        bpm (float): Optional preferred tempo; ranks a sample of catalog playlists
+            by how close their tracks' tempo is and returns the best match
+        metrics (dict): Optional dict that receives the ranking's API call counts
     """
     try:
         if sp_client is None:
             if not hasattr(st, 'secrets') or not st.secrets.get("SPOTIFY_CLIENT_ID"):
                 st.error("❌ Spotify API credentials not configured.")
                 return None
-            import spotipy
-            from spotipy.oauth2 import SpotifyClientCredentials
-            sp_client = spotipy.Spotify(auth_manager=SpotifyClientCredentials(
-                client_id=st.secrets["SPOTIFY_CLIENT_ID"],
-                client_secret=st.secrets["SPOTIFY_CLIENT_SECRET"]
-            ))
+            sp_client = get_spotify_client(
+                st.secrets["SPOTIFY_CLIENT_ID"],
+                st.secrets["SPOTIFY_CLIENT_SECRET"]
+            )
             
-        results = sp_client.search(q=genre, type='playlist', limit=5)
-        if not results or 'playlists' not in results or not results['playlists']['items']:
+        # Weighted pick from the local catalog; no network call once the genre is synced
+        catalog = get_catalog()
+        if bpm is not None:
+            candidates = catalog.sample(genre, RANK_CANDIDATES)
+            if candidates:
+                try:
+                    ranked = await rank_playlists(sp_client, candidates, bpm, metrics)
+                    if np.isfinite(ranked[0]['score']):
+                        return ranked[0]['url']
+                except Exception:
+                    # Audio features unavailable; fall back to a weighted pick
+                    pass
+        url = catalog.pick(genre)
+        if url:
+            return url
+        
+        # Cold miss: search live and seed the catalog until the next sync
+        playlists = await search_playlists(sp_client, genre)
+        if not playlists:
             st.error("❌ No playlists found for this genre. Please try another genre.")
             return None
+        catalog.seed(genre, playlists)
             
-        playlist = random.choice(results['playlists']['items'])
+        playlist = random.choice(playlists)
         return playlist['external_urls']['spotify']
         
     except Exception:
@@ -211,15 +539,15 @@ async def get_spotify_playlist(genre, sp_client=None):
 
 async def create_and_compose(genre):
     """Create and compose a new track of the specified genre using Lyria."""
-    if not API_KEY:
+    if not get_api_key():
         st.error("❌ Music generation is not available. Missing Lyria API key.")
         return None
 
     try:
         #with st.spinner('🎵 Composing your personalized music...'):
-        filename = await generate_genre_track(genre, duration_seconds=10)
-        if filename:
-            return filename
+        track = await generate_genre_track(genre, duration_seconds=10)
+        if track:
+            return track
         else:
             st.error("Failed to generate music.")
             return None
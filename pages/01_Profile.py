@@ -16,7 +16,7 @@ st.markdown("""
 if not is_authenticated():
     show_login_page()
 else:
-    async def profile_page(user_profile, model):
+    async def profile_page(user_profile):
         """Display user profile page."""
         st.title("👤 Your Profile")
         
@@ -28,7 +28,7 @@ else:
         st.info("📊 **Want to update your current mood or analyze music preferences?** Navigate to 'Current Mood' page to track your emotional state and get personalized music recommendations.")
 
     # Get user data from session state
-    if 'user_profile' in st.session_state and 'model' in st.session_state:
-        asyncio.run(profile_page(st.session_state.user_profile, st.session_state.model))
+    if 'user_profile' in st.session_state:
+        asyncio.run(profile_page(st.session_state.user_profile))
     else:
         st.error("Please go to main page first to load your profile.")
@@ -1,7 +1,8 @@
 import streamlit as st
 import asyncio
-from database import get_user_profile, save_user_profile, update_user_mood
+from database import get_user_profile, update_user_mood, get_mood_rollups, mood_trends
 from music import predict_favorite_genre
+from model_registry import get_model
 from datetime import datetime
 from login import is_authenticated, show_login_page
 
@@ -58,24 +59,45 @@ else:
                     'MoodLastUpdated': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 }
                 user_profile.update(mood_data)
-                if save_user_profile(user_email, user_profile):
+                # Updates the profile and appends to the mood history in one batch
+                if update_user_mood(user_email, mood_data):
+                    # Keep the session copy in sync so predictions use the new mood
+                    st.session_state.user_profile = user_profile
                     st.success("✅ Mood updated!")
                     st.rerun()
                     
                 else:
                     st.error("❌ Failed to update mood.")
             # --- END OF THE FORM ---
+        
+        st.header("📈 Mood Trends")
+        period = st.radio("View", ["day", "week"], horizontal=True, key="mood_trend_period",
+                          format_func=lambda p: "Daily" if p == "day" else "Weekly")
+        try:
+            rollups = get_mood_rollups(user_email, period)
+            trends = mood_trends(rollups, period, window=7 if period == "day" else 4)
+            if trends.empty:
+                st.write("No mood history yet. Update your mood to start tracking trends.")
+            else:
+                st.caption("Rolling average over the last 7 days" if period == "day"
+                           else "Rolling average over the last 4 weeks")
+                st.line_chart(trends)
+        except Exception as e:
+            st.warning(f"Could not load mood trends: {str(e)}")
                         
     st.markdown("---")
     st.header("🎵 Music Preferences Analysis")
     
-    # Get model from session state
-    model = st.session_state.get('model')
+    # Get the shared model handle from the process-wide registry
+    try:
+        model = get_model()
+    except Exception:
+        model = None
     if model:
         if st.button("Predict Your Favorite Genre", key="predict_genre_mood", type="primary"):
             with st.spinner('Analyzing your preferences...'):
                 try:
-                    genre = predict_favorite_genre(st.session_state.user_profile, st.session_state.model)
+                    genre = predict_favorite_genre(st.session_state.user_profile, model)
                     st.success(f"Based on your profile and current mood, your predicted favorite genre is: **{genre}**")
                     
                     # Show music recommendations based on profile and mood
@@ -1,6 +1,14 @@
 import streamlit as st
-import asyncio
-from music import predict_favorite_genre, create_and_compose
+import time
+from music import (
+    predict_favorite_genre, get_api_key, get_track_pool, get_job_queue,
+    rank_genres, plan_variations, TrackBuffer, GENRE_PROMPTS, SAMPLE_RATE, CHANNELS, SAMPLE_WIDTH
+)
+from model_registry import get_model
+from audio_encoding import AUDIO_FORMATS
+from generation_jobs import (
+    QueueFull, generate_variation_batch, BATCH, QUEUED, DONE, FAILED, CANCELLED, FINISHED
+)
 from datetime import datetime
 from login import is_authenticated, show_login_page
 
@@ -13,59 +21,282 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+TRACK_SECONDS = 10
+TRACK_BYTES = TRACK_SECONDS * SAMPLE_RATE * CHANNELS * SAMPLE_WIDTH
+# Seconds between fragment reruns while a generation job is pending
+POLL_SECONDS = 0.5
+
+def format_timings(metrics):
+    """One-line summary of the generation phases recorded by stream_prompts."""
+    parts = []
+    if 'connect_time' in metrics:
+        reused = " (warm session)" if metrics.get('session_reused') else ""
+        parts.append(f"connect: {metrics['connect_time']:.2f}s{reused}")
+    if 'time_to_first_audio' in metrics:
+        parts.append(f"first audio: {metrics['time_to_first_audio']:.2f}s")
+    if 'steady_rate' in metrics:
+        parts.append(f"steady state: {metrics['steady_rate']:.2f}× real time")
+    if 'total_time' in metrics:
+        parts.append(f"total: {metrics['total_time']:.2f}s")
+    return " · ".join(parts)
+
+def describe_job(status):
+    if status['state'] == QUEUED:
+        if status['position']:
+            return f"⏳ Queued ({status['position']} ahead of you)"
+        return "⏳ Queued, starting soon"
+    return f"🎼 Composing... {status['elapsed']:.0f}s"
+
+def finish_notice(status):
+    """Message to show once a job ends without a result, as (level, text)."""
+    if status is None:
+        return ('error', "❌ Generation job expired. Please try again.")
+    if status['state'] == FAILED:
+        return ('error', f"❌ Lyria Connection Error: {status['error']}")
+    if status['state'] == CANCELLED:
+        return ('warning', "Generation was cancelled.")
+    return None
+
+def show_notice(key):
+    notice = st.session_state.pop(key, None)
+    if notice:
+        getattr(st, notice[0])(notice[1])
+
+@st.fragment(run_every=POLL_SECONDS)
+def follow_track_job(jobs):
+    """Poll the pending single-track job on short fragment reruns, playing its audio from the first chunk.
+    
+    The job ID lives in session state and the job keeps running in its
+    worker between reruns, so rerunning or leaving the page does not lose
+    it; only the Cancel button (or logging out) cancels it. Once the job
+    finishes, its result is stored and the whole page reruns to show it.
+    """
+    job = st.session_state.get('track_job')
+    if job is None:
+        return
+    if st.button("✖️ Cancel", key="cancel_generation"):
+        jobs.cancel(job['id'])
+    status = jobs.status(job['id'])
+    if status is None or status['state'] in FINISHED:
+        del st.session_state.track_job
+        if status is not None and status['state'] == DONE and status['result']:
+            # Live results are not cached: take() only hands out pooled ready tracks
+            st.session_state.generated_track = dict(status['result'], genre=job['genre'])
+            record_history(job['genre'])
+        else:
+            st.session_state.track_notice = finish_notice(status)
+        st.rerun()
+
+    spooled = status['spool'].audio_bytes() if status['state'] != QUEUED else 0
+    if spooled and 'preview' not in job:
+        # Start playback as soon as the worker has spooled the first chunk; the
+        # same bytes are rendered on later reruns so the player keeps playing
+        preview = TrackBuffer(TRACK_SECONDS)
+        preview.append(status['spool'].read_audio(CHANNELS * SAMPLE_WIDTH))
+        job['preview'] = preview.getvalue()
+    if 'preview' in job:
+        st.audio(job['preview'], format='audio/wav')
+        st.progress(min(spooled / TRACK_BYTES, 1.0), text="Composing...")
+    else:
+        st.info(describe_job(status))
+
+@st.fragment(run_every=POLL_SECONDS)
+def follow_variation_job(jobs):
+    """Poll the pending variation batch on short fragment reruns, playing each variation as it lands.
+    
+    Like follow_track_job, the job survives reruns and navigation and is
+    only cancelled from its Cancel button or on logout.
+    """
+    job = st.session_state.get('variation_job')
+    if job is None:
+        return
+    if st.button("✖️ Cancel", key="cancel_variations"):
+        jobs.cancel(job['id'])
+    status = jobs.status(job['id'])
+    variations = job['variations']
+    if status is None or status['state'] in FINISHED:
+        del st.session_state.variation_job
+        if status is not None and status['state'] == DONE and status['result']:
+            st.session_state.variations = list(zip(variations, status['result']))
+        else:
+            st.session_state.variation_notice = finish_notice(status)
+        st.rerun()
+
+    if status['state'] == QUEUED:
+        st.info(describe_job(status))
+        return
+    # Parts are read from the spool once and kept with the job for later reruns
+    job['parts'].update(status['spool'].parts(skip=job['parts']))
+    st.progress(
+        len(job['parts']) / len(variations), text=f"{len(job['parts'])} of {len(variations)} variations ready"
+    )
+    for index in sorted(job['parts']):
+        result = job['parts'][index]
+        st.markdown(f"**{variations[index]['label']}**")
+        if result['error']:
+            st.warning(f"Could not generate this variation: {result['error']}")
+        else:
+            audio, mime = track_audio(result)
+            st.audio(audio, format=mime)
+
+def record_history(genre):
+    if 'music_history' not in st.session_state:
+        st.session_state.music_history = []
+    filename = f"{genre.replace(' ', '_')}_track.wav"
+    st.session_state.music_history.append((genre, datetime.now().strftime("%Y-%m-%d %H:%M"), filename))
+
+def track_audio(result):
+    """Return (bytes, mime type) to play for a finished track, compressed if available."""
+    spec = AUDIO_FORMATS.get(result.get('audio_format'))
+    if spec and result.get('compressed'):
+        return result['compressed'], spec['mime']
+    return result['wav'], 'audio/wav'
+
+def show_track(result, basename, key):
+    """Play a finished track (compressed if available) and offer downloads."""
+    spec = AUDIO_FORMATS.get(result.get('audio_format'))
+    compressed = result.get('compressed') if spec else None
+    audio, mime = track_audio(result)
+    st.audio(audio, format=mime)
+    if result.get('metrics', {}).get('timed_out'):
+        st.warning("⏱️ Generation hit its deadline; keeping the audio received so far.")
+    if result.get('metrics'):
+        st.caption(format_timings(result['metrics']))
+
+    # Provide download options; WAV is only an explicit download
+    if compressed:
+        st.download_button(
+            label=f"📥 Download Music ({spec['extension'].upper()})",
+            data=compressed,
+            file_name=f"{basename}.{spec['extension']}",
+            mime=spec['mime'],
+            key=f"download_{key}"
+        )
+    st.download_button(
+        label="📥 Download Music (WAV)" if compressed else "📥 Download Music",
+        data=result['wav'],
+        file_name=f"{basename}.wav",
+        mime="audio/wav",
+        type="secondary",
+        key=f"download_wav_{key}"
+    )
+
 # Check authentication before showing page
 if not is_authenticated():
     show_login_page()
 else:
     st.title("🎵 AI-Generated Music")
-    
+    user = st.session_state.get('user_email') or 'anonymous'
+    jobs = get_job_queue()
+
+    # Keep pre-generated tracks ready for every genre in the background
+    if get_api_key():
+        get_track_pool().start()
+
     # Show user's predicted genre
     try:
-        predicted_genre = predict_favorite_genre(st.session_state.user_profile, st.session_state.model)
+        predicted_genre = predict_favorite_genre(st.session_state.user_profile, get_model())
         st.info(f"Your predicted favorite genre: **{predicted_genre}**")
     except Exception as e:
         predicted_genre = "Pop"
         st.warning(f"Could not predict genre: {str(e)}. Using default: {predicted_genre}")
-        
+
     # Music generation section
     st.header("Generate Personalized Music")
-    
+
     col1, col2 = st.columns([2, 1])
-    
+
     with col1:
         st.write("Generate a unique AI-composed track based on your mood and preferences.")
-        
-        if st.button("🎼 Generate AI Music", key="generate_ai_music", type="primary"):
-            with st.spinner("Generating your personalized music..."):
-                filename = asyncio.run(create_and_compose(predicted_genre))
-            if filename:
-                # Store in history
-                if 'music_history' not in st.session_state:
-                    st.session_state.music_history = []
-                st.session_state.music_history.append((predicted_genre, datetime.now().strftime("%Y-%m-%d %H:%M"), filename))
-                
-                st.success("✅ Music generated successfully!")
-                
-                # Display music player
-                st.subheader("🎵 Your Generated Music")
-                st.audio(filename, format='audio/wav')
-                
-                # Provide download option
-                with open(filename, 'rb') as audio_file:
-                    st.download_button(
-                        label="📥 Download Music",
-                        data=audio_file.read(),
-                        file_name=f"{predicted_genre}_track.wav",
-                        mime="audio/wav"
+
+        # One pending track at a time; the fragment below offers to cancel it
+        if st.button("🎼 Generate AI Music", key="generate_ai_music", type="primary",
+                     disabled='track_job' in st.session_state):
+            if not get_api_key():
+                st.error("❌ Music generation is not available. Missing Lyria API key.")
+            else:
+                pool = get_track_pool()
+
+                # Serve the track reserved at login, or a pre-generated one closest to the user's BPM
+                started = time.perf_counter()
+                prefetch = st.session_state.get('prefetch')
+                track = prefetch.take_track(predicted_genre) if prefetch is not None else None
+                if not track:
+                    track = pool.take(predicted_genre, bpm=(st.session_state.get('user_profile') or {}).get('BPM'))
+                job_id = prefetch.take_job(predicted_genre) if prefetch is not None and not track else None
+                if track:
+                    elapsed = time.perf_counter() - started
+                    # Pooled tracks carry the copy compressed when they were generated
+                    st.session_state.generated_track = dict(
+                        track, genre=predicted_genre,
+                        metrics={'time_to_first_audio': elapsed, 'total_time': elapsed}
+                    )
+                    record_history(predicted_genre)
+                elif job_id is None:
+                    # Generate in a worker process, so admission limits apply across users
+                    try:
+                        job_id = jobs.submit(user, [(GENRE_PROMPTS[predicted_genre], 1.0)], TRACK_SECONDS)
+                    except QueueFull as e:
+                        st.error(f"❌ {e}. Please wait for your current tracks to finish.")
+
+                if job_id is not None:
+                    # The job runs in a worker; the fragment below follows it across reruns
+                    st.session_state.pop('generated_track', None)
+                    st.session_state.track_job = {'id': job_id, 'genre': predicted_genre}
+                    st.rerun()
+
+        show_notice('track_notice')
+        if 'track_job' in st.session_state:
+            follow_track_job(jobs)
+
+        generated = st.session_state.get('generated_track')
+        if generated:
+            st.subheader("🎵 Your Generated Music")
+            show_track(generated, f"{generated['genre'].replace(' ', '_')}_track", "generated")
+            st.success("✅ Music generated successfully!")
+
+        st.markdown("#### Compare variations")
+        st.write("Generate a few takes at once from your predicted genre and its runners-up.")
+        variation_count = st.slider("Number of variations", 2, 4, 3, key="variation_count")
+        if st.button("🎛️ Generate Variations", key="generate_variations",
+                     disabled='variation_job' in st.session_state):
+            if not get_api_key():
+                st.error("❌ Music generation is not available. Missing Lyria API key.")
+            else:
+                ranked = rank_genres(st.session_state.user_profile, get_model())
+                variations = plan_variations(ranked, variation_count)
+                # The whole batch is one job, generated concurrently in one worker;
+                # it queues behind single tracks from every user
+                try:
+                    job_id = jobs.submit(
+                        user, variations, TRACK_SECONDS, priority=BATCH, run=generate_variation_batch
                     )
+                except QueueFull as e:
+                    st.error(f"❌ {e}. Please wait for your current tracks to finish.")
+                else:
+                    st.session_state.pop('variations', None)
+                    st.session_state.variation_job = {'id': job_id, 'variations': variations, 'parts': {}}
+                    st.rerun()
+
+        show_notice('variation_notice')
+        if 'variation_job' in st.session_state:
+            follow_variation_job(jobs)
+
+        for variation, result in st.session_state.get('variations', []):
+            st.markdown(f"**{variation['label']}**")
+            if result['error']:
+                st.warning(f"Could not generate this variation: {result['error']}")
             else:
-                st.error("❌ Failed to generate music. Please try again.")
-    
+                show_track(
+                    result, f"{variation['label'].replace(' ', '_')}_{variation['seed']}",
+                    f"variation_{variation['seed']}"
+                )
+
     with col2:
         st.subheader("Music History")
         if 'music_history' not in st.session_state:
             st.session_state.music_history = []
-        
+
         if st.session_state.music_history:
             for i, (genre, timestamp, filename) in enumerate(st.session_state.music_history[-5:], 1):
                 st.write(f"{i}. {genre} - {timestamp}")
@@ -73,5 +304,5 @@ else:
             st.write("No music generated yet.")
 
 # Get user data from session state
-if 'user_profile' not in st.session_state or 'model' not in st.session_state:
+if 'user_profile' not in st.session_state:
     st.error("Please go to the main page first to load your profile.")
@@ -1,6 +1,7 @@
 import streamlit as st
 import asyncio
 from music import predict_favorite_genre, get_spotify_playlist
+from model_registry import get_model
 from datetime import datetime
 from login import is_authenticated, show_login_page
 
@@ -21,7 +22,7 @@ else:
     
     # Show user's predicted genre
     try:
-        predicted_genre = predict_favorite_genre(st.session_state.user_profile, st.session_state.model)
+        predicted_genre = predict_favorite_genre(st.session_state.user_profile, get_model())
         st.info(f"Your predicted favorite genre: **{predicted_genre}**")
     except Exception as e:
         predicted_genre = "Pop"
@@ -39,10 +40,23 @@ else:
         with col1:
             st.write("Get curated Spotify playlists based on your music preferences and current mood.")
             
+            preferred_bpm = (st.session_state.get('user_profile') or {}).get('BPM')
+            match_bpm = st.checkbox(
+                f"🎚️ Match my preferred tempo ({preferred_bpm} BPM)" if preferred_bpm else "🎚️ Match my preferred tempo",
+                key="match_bpm", disabled=not preferred_bpm
+            )
+            
             if st.button("🎧 Get Spotify Playlist", key="get_spotify_playlist", type="primary"):
                 with st.spinner('🎧 Finding your perfect playlist...'):
                     try:
-                        playlist_url = asyncio.run(get_spotify_playlist(predicted_genre, st.session_state.sp_client))
+                        metrics = {}
+                        playlist_url = asyncio.run(get_spotify_playlist(
+                            predicted_genre, st.session_state.sp_client,
+                            bpm=preferred_bpm if match_bpm else None, metrics=metrics
+                        ))
+                        if 'api_calls' in metrics:
+                            st.caption(f"Ranked by tempo with {metrics['api_calls']} Spotify API calls "
+                                       f"({metrics['cached_tracks']} tracks already cached)")
                         
                         if playlist_url:
                             # Store in history
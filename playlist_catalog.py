@@ -0,0 +1,308 @@
+# playlist_catalog.py
+"""Local catalog of Spotify playlists per genre, kept in SQLite.
+
+A background sync pages through Spotify search results for every genre,
+fetches each playlist's follower count, and replaces the genre's rows in
+one transaction. Requests then pick a playlist from an in-memory snapshot
+of the catalog, weighted by popularity, without touching the network.
+Only a genre that has never been synced falls back to a live search,
+whose results seed the catalog until the next sync.
+
+Usage:
+    python playlist_catalog.py            # sync every genre once (e.g. from cron)
+    python playlist_catalog.py --pages 8  # 8 x 50 search results per genre
+"""
+
+import argparse
+import asyncio
+import bisect
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+
+CATALOG_PATH = Path(os.environ.get("MUSICREC_PLAYLIST_CATALOG", "playlist_catalog.sqlite3"))
+SYNC_INTERVAL = int(os.environ.get("MUSICREC_CATALOG_SYNC_INTERVAL", 6 * 3600))
+SYNC_PAGES = 4
+PAGE_SIZE = 50
+# Follower lookups in flight at once during a sync
+FOLLOWER_BATCH = 8
+# Playlists shorter than this are rarely useful recommendations
+MIN_TRACKS = 10
+# Snapshots are reloaded from disk this often, to pick up syncs by other processes
+RELOAD_SECONDS = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS playlists (
+    genre TEXT NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT,
+    url TEXT NOT NULL,
+    owner TEXT,
+    tracks INTEGER,
+    followers INTEGER,
+    weight REAL NOT NULL,
+    PRIMARY KEY (genre, id)
+);
+CREATE TABLE IF NOT EXISTS syncs (
+    genre TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL,
+    playlists INTEGER NOT NULL
+);
+"""
+
+
+def playlist_weight(followers, tracks):
+    """Pick weight: grows with the log of followers, so huge playlists don't crowd out the rest."""
+    return 1.0 + math.log1p(followers or 0) if (tracks or 0) >= MIN_TRACKS else 0.1
+
+
+def playlist_row(genre, item, followers=None):
+    tracks = (item.get('tracks') or {}).get('total')
+    return (
+        genre, item['id'], item.get('name'), item['external_urls']['spotify'],
+        (item.get('owner') or {}).get('display_name'), tracks, followers,
+        playlist_weight(followers, tracks)
+    )
+
+
+class PlaylistCatalog:
+    """SQLite-backed playlist catalog with in-memory weighted pick snapshots."""
+
+    def __init__(self, path=CATALOG_PATH, reload_seconds=RELOAD_SECONDS):
+        self.path = Path(path)
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        # genre -> (ids, urls, cumulative weights, loaded_at)
+        self._snapshots = {}
+        self.picks = 0
+        self.misses = 0
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per operation, since sqlite3 connections
+        # are per thread; the block runs as a single transaction
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _load(self, genre):
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT id, url, weight FROM playlists WHERE genre = ? ORDER BY id", (genre,)
+            ).fetchall()
+        ids, urls, cumulative, total = [], [], [], 0.0
+        for playlist_id, url, weight in rows:
+            total += weight
+            ids.append(playlist_id)
+            urls.append(url)
+            cumulative.append(total)
+        snapshot = (ids, urls, cumulative, time.monotonic())
+        with self._lock:
+            self._snapshots[genre] = snapshot
+        return snapshot
+
+    def _snapshot(self, genre):
+        with self._lock:
+            snapshot = self._snapshots.get(genre)
+        if snapshot is None or time.monotonic() - snapshot[3] > self.reload_seconds:
+            snapshot = self._load(genre)
+        return snapshot
+
+    def _draw(self, cumulative, rng):
+        return min(bisect.bisect_right(cumulative, rng.random() * cumulative[-1]), len(cumulative) - 1)
+
+    def pick(self, genre, rng=random):
+        """Return a weighted random playlist URL for the genre, or None if the catalog has none."""
+        _, urls, cumulative, _ = self._snapshot(genre)
+        if not urls:
+            self.misses += 1
+            return None
+        self.picks += 1
+        return urls[self._draw(cumulative, rng)]
+
+    def sample(self, genre, k, rng=random):
+        """Return up to k distinct weighted random (id, url) pairs for the genre."""
+        ids, urls, cumulative, _ = self._snapshot(genre)
+        if not ids:
+            self.misses += 1
+            return []
+        self.picks += 1
+        chosen = {}
+        # Redraw duplicates a bounded number of times instead of renormalizing
+        for _ in range(4 * k):
+            i = self._draw(cumulative, rng)
+            chosen.setdefault(i, (ids[i], urls[i]))
+            if len(chosen) >= min(k, len(ids)):
+                break
+        return list(chosen.values())
+
+    def replace_genre(self, genre, rows):
+        """Swap in a genre's freshly synced playlists in one transaction."""
+        with self._connect() as db:
+            db.execute("DELETE FROM playlists WHERE genre = ?", (genre,))
+            db.executemany("INSERT OR REPLACE INTO playlists VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            db.execute("INSERT OR REPLACE INTO syncs VALUES (?, ?, ?)", (genre, time.time(), len(rows)))
+        self._load(genre)
+
+    def seed(self, genre, items):
+        """Record live search results for a genre that has not been synced yet."""
+        rows = [playlist_row(genre, item) for item in items if item and item.get('id')]
+        with self._connect() as db:
+            db.executemany("INSERT OR IGNORE INTO playlists VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self._load(genre)
+
+    def last_synced(self):
+        """Return genre -> unix time of its last full sync."""
+        with self._connect() as db:
+            return dict(db.execute("SELECT genre, synced_at FROM syncs").fetchall())
+
+    def stats(self):
+        with self._connect() as db:
+            counts = dict(db.execute("SELECT genre, COUNT(*) FROM playlists GROUP BY genre").fetchall())
+        return {'playlists': counts, 'picks': self.picks, 'misses': self.misses}
+
+
+async def fetch_genre(client, genre, pages=SYNC_PAGES):
+    """Page through search results for a genre and fetch every playlist's follower count.
+
+    Every call is made at BACKGROUND priority, and follower lookups go out
+    FOLLOWER_BATCH at a time, so a sync never floods the scheduler's queue
+    ahead of page requests.
+
+    Returns:
+        list: Catalog rows for the genre
+    """
+    from spotify_cache import playlist_items
+    from spotify_scheduler import BACKGROUND
+
+    items = {}
+    for page in range(pages):
+        results = await client.search(
+            q=genre, type='playlist', limit=PAGE_SIZE, offset=page * PAGE_SIZE, priority=BACKGROUND
+        )
+        page_items = playlist_items(results)
+        for item in page_items:
+            items.setdefault(item['id'], item)
+        if len(page_items) < PAGE_SIZE:
+            break
+
+    async def followers(playlist_id):
+        try:
+            meta = await client.playlist(playlist_id, fields='followers.total', priority=BACKGROUND)
+            return (meta.get('followers') or {}).get('total')
+        except Exception:
+            return None
+
+    ids = list(items)
+    counts = []
+    for start in range(0, len(ids), FOLLOWER_BATCH):
+        counts += await asyncio.gather(*(followers(playlist_id) for playlist_id in ids[start:start + FOLLOWER_BATCH]))
+    return [playlist_row(genre, item, count) for item, count in zip(items.values(), counts)]
+
+
+async def sync_catalog(catalog, client, genres, pages=SYNC_PAGES, max_age=0):
+    """Re-sync every genre whose last sync is older than max_age seconds.
+
+    Returns:
+        dict: genre -> playlists stored, or the error message for genres that failed
+    """
+    last_synced = catalog.last_synced()
+    report = {}
+    for genre in genres:
+        if time.time() - last_synced.get(genre, 0) < max_age:
+            continue
+        try:
+            rows = await fetch_genre(client, genre, pages)
+        except Exception as e:
+            report[genre] = str(e)
+            continue
+        if rows:
+            catalog.replace_genre(genre, rows)
+        report[genre] = len(rows)
+    return report
+
+
+class CatalogSyncer:
+    """Daemon thread that keeps the catalog at most `interval` seconds old."""
+
+    def __init__(self, catalog, client, genres, interval=SYNC_INTERVAL, pages=SYNC_PAGES):
+        self.catalog = catalog
+        self.client = client
+        self.genres = genres
+        self.interval = interval
+        self.pages = pages
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="playlist-catalog-sync", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.last_report = asyncio.run(
+                    sync_catalog(self.catalog, self.client, self.genres, self.pages, max_age=self.interval)
+                )
+            except Exception as e:
+                self.last_report = {'error': str(e)}
+            # Check again well before the oldest genre goes stale
+            self._stop.wait(min(self.interval / 4, 3600))
+
+
+@lru_cache(maxsize=1)
+def get_catalog():
+    """Return the process-wide playlist catalog."""
+    return PlaylistCatalog()
+
+
+@lru_cache(maxsize=4)
+def get_catalog_syncer(client):
+    """Return the background syncer for a Spotify client (one per set of credentials)."""
+    from music import GENRE_MAPPING
+
+    return CatalogSyncer(get_catalog(), client, GENRE_MAPPING)
+
+
+def main():
+    from music import GENRE_MAPPING
+    from spotify_client import AsyncSpotifyClient
+
+    parser = argparse.ArgumentParser(description="Sync the local Spotify playlist catalog.")
+    parser.add_argument("--catalog", default=str(CATALOG_PATH), help="SQLite catalog file")
+    parser.add_argument("--pages", type=int, default=SYNC_PAGES, help=f"Search pages of {PAGE_SIZE} per genre")
+    parser.add_argument("--genres", nargs="+", default=GENRE_MAPPING, help="Genres to sync")
+    args = parser.parse_args()
+
+    client = AsyncSpotifyClient(os.environ["SPOTIFY_CLIENT_ID"], os.environ["SPOTIFY_CLIENT_SECRET"])
+    catalog = PlaylistCatalog(args.catalog)
+    try:
+        report = asyncio.run(sync_catalog(catalog, client, args.genres, args.pages))
+    finally:
+        client.close()
+    for genre, result in report.items():
+        print(f"{genre}: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# playlist_ranking.py
+"""Rank candidate playlists by how close their tempo is to a target BPM.
+
+For each candidate playlist, the first page of track IDs is fetched, and
+the audio features (tempo, energy) of every track not already cached are
+fetched in batches of 100 IDs, Spotify's maximum per call. Tracklists and
+features are cached process-wide, so repeat rankings over the same genre
+cost few or no API calls. Scoring is one vectorized pass over a
+playlists x tracks tempo matrix.
+"""
+
+import asyncio
+import warnings
+
+import numpy as np
+
+from cache import LRUCache
+from track_features import tempo_distance
+
+FEATURES_BATCH = 100
+TRACKS_PER_PLAYLIST = 100
+# Playlists with fewer analyzed tracks than this are ranked last
+MIN_SCORED_TRACKS = 5
+
+# Track audio features never change; tracklists do, slowly
+FEATURE_CACHE = LRUCache(maxsize=200_000, ttl=7 * 24 * 3600)
+TRACKLIST_CACHE = LRUCache(maxsize=2048, ttl=24 * 3600)
+
+# Marks a track Spotify has no features for, so it is not requested again
+_NO_FEATURES = (np.nan, np.nan)
+
+
+async def _tracklist(client, playlist_id, metrics):
+    track_ids = TRACKLIST_CACHE.get(playlist_id)
+    if track_ids is None:
+        page = await client.playlist_items(
+            playlist_id, fields='items(track(id,type))', limit=TRACKS_PER_PLAYLIST
+        )
+        metrics['playlist_calls'] += 1
+        track_ids = [
+            item['track']['id'] for item in (page or {}).get('items') or []
+            if item and item.get('track') and item['track'].get('id') and item['track'].get('type', 'track') == 'track'
+        ]
+        TRACKLIST_CACHE.put(playlist_id, track_ids)
+    return track_ids
+
+
+async def _fetch_features(client, track_ids, metrics):
+    missing = list(dict.fromkeys(t for t in track_ids if FEATURE_CACHE.get(t) is None))
+    metrics['cached_tracks'] += len(set(track_ids)) - len(missing)
+    batches = [missing[i:i + FEATURES_BATCH] for i in range(0, len(missing), FEATURES_BATCH)]
+    results = await asyncio.gather(*(client.audio_features(batch) for batch in batches))
+    metrics['feature_calls'] += len(batches)
+    for batch, features in zip(batches, results):
+        by_id = {f['id']: f for f in features if f}
+        for track_id in batch:
+            f = by_id.get(track_id)
+            FEATURE_CACHE.put(track_id, (f.get('tempo', np.nan), f.get('energy', np.nan)) if f else _NO_FEATURES)
+
+
+def score_playlists(tracklists, bpm):
+    """Score playlists by the median tempo distance of their tracks to bpm (lower is better).
+
+    Returns:
+        tuple: (scores, median tempos, mean energies) as arrays, one entry per playlist
+    """
+    width = max((len(ids) for ids in tracklists), default=0) or 1
+    features = np.full((len(tracklists), width, 2), np.nan, dtype=np.float32)
+    for row, track_ids in enumerate(tracklists):
+        for col, track_id in enumerate(track_ids):
+            features[row, col] = FEATURE_CACHE.get(track_id, _NO_FEATURES)
+    tempos, energies = features[..., 0], features[..., 1]
+    distances = tempo_distance(tempos.ravel(), bpm).reshape(tempos.shape)
+    distances[np.isnan(tempos)] = np.nan
+    with warnings.catch_warnings():
+        # Playlists with no analyzed tracks give all-NaN rows
+        warnings.simplefilter('ignore', RuntimeWarning)
+        counts = (~np.isnan(tempos)).sum(axis=1)
+        scores = np.where(counts >= MIN_SCORED_TRACKS, np.nanmedian(distances, axis=1), np.inf)
+        return scores, np.nanmedian(tempos, axis=1), np.nanmean(energies, axis=1)
+
+
+async def rank_playlists(client, candidates, bpm, metrics=None):
+    """Rank (playlist id, url) candidates by tempo match to bpm.
+
+    Args:
+        client: Async Spotify client (see spotify_client)
+        candidates (list): (playlist id, url) pairs
+        bpm (float): Target tempo
+        metrics (dict): Optional dict that receives 'playlist_calls',
+            'feature_calls', 'api_calls' and 'cached_tracks'
+
+    Returns:
+        list: dicts with 'id', 'url', 'score', 'tempo' and 'energy', best first
+    """
+    metrics = {} if metrics is None else metrics
+    metrics.update(playlist_calls=0, feature_calls=0, cached_tracks=0)
+    tracklists = await asyncio.gather(*(_tracklist(client, playlist_id, metrics) for playlist_id, _ in candidates))
+    # One batched feature fetch across every candidate, so shared tracks are requested once
+    await _fetch_features(client, [t for ids in tracklists for t in ids], metrics)
+    metrics['api_calls'] = metrics['playlist_calls'] + metrics['feature_calls']
+
+    scores, tempos, energies = score_playlists(tracklists, bpm)
+    order = np.argsort(scores, kind='stable')
+    return [
+        {
+            'id': candidates[i][0], 'url': candidates[i][1], 'score': float(scores[i]),
+            'tempo': float(tempos[i]), 'energy': float(energies[i])
+        }
+        for i in order
+    ]
@@ -0,0 +1,39 @@
+# prediction_cache.py
+
+import hashlib
+
+from cache import LRUCache
+
+# Keys are content hashes of (model version, encoded features), so a changed
+# profile or a new model simply misses; nothing needs invalidating
+PREDICTION_CACHE = LRUCache(maxsize=4096)
+
+
+def model_version(model):
+    """Return the manifest hash of a registry handle, or None for a bare model."""
+    return getattr(model, 'version', None)
+
+
+def prediction_key(features, model):
+    """Stable key for one encoded feature row (float32) and the model that scores it.
+
+    Returns None for models without a registry version; their predictions are not cached.
+    """
+    version = model_version(model)
+    if version is None:
+        return None
+    digest = hashlib.blake2b(features.tobytes(), digest_size=16).hexdigest()
+    return (version, digest)
+
+
+def get_prediction(key):
+    return PREDICTION_CACHE.get(key) if key is not None else None
+
+
+def put_prediction(key, genre):
+    if key is not None:
+        PREDICTION_CACHE.put(key, genre)
+
+
+def prediction_cache_stats():
+    return PREDICTION_CACHE.stats()
@@ -0,0 +1,171 @@
+# prefetch.py
+"""Background prefetch of the predicted genre's playlist and track at login.
+
+Home starts a prefetch as soon as the profile and model are loaded, so by
+the time the user opens a page:
+  - the genre prediction is in the prediction cache
+  - the genre's playlist catalog snapshot is loaded and, when the profile
+    has a BPM, a sample of its playlists is ranked so the tracklist and
+    audio feature caches the playlist page ranks from are warm (Spotify is
+    only searched live for a genre the catalog has nothing for)
+  - a pre-generated track closest to the user's BPM is reserved for them,
+    or (with MUSICREC_PREFETCH_GENERATE=1) a generation job is queued
+
+Prefetches run on a small bounded thread pool so they never hold up a
+Streamlit script run, and at most one runs per user.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+PREFETCH_WORKERS = int(os.environ.get("MUSICREC_PREFETCH_WORKERS", 4))
+# Queue a generation job when no pre-generated track is ready (uses Lyria quota)
+PREFETCH_GENERATE = os.environ.get("MUSICREC_PREFETCH_GENERATE", "0") == "1"
+# Matches the music page's track length, so pooled tracks and jobs are interchangeable
+TRACK_SECONDS = 10
+
+
+class Prefetch:
+    """Handle for one user's prefetch; kept in st.session_state by Home."""
+
+    def __init__(self, user_key):
+        self.user_key = user_key
+        self.future = None
+        self.genre = None
+        self.playlists = 0
+        self.error = None
+        self.job_id = None
+        self._track = None
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def cancel(self):
+        """Stop the prefetch; a reserved track is dropped and a queued job cancelled."""
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+        with self._lock:
+            self._track = None
+            job_id, self.job_id = self.job_id, None
+        if job_id is not None:
+            from music import get_job_queue
+
+            get_job_queue().cancel(job_id)
+
+    def take_track(self, genre):
+        """Claim the reserved track if it matches `genre`; returns the pool's track dict once, else None."""
+        with self._lock:
+            if self.genre != genre or self._track is None:
+                return None
+            track, self._track = self._track, None
+            return track
+
+    def take_job(self, genre):
+        """Claim the queued generation job if it matches `genre`; returns its ID once, else None."""
+        with self._lock:
+            if self.genre != genre or self.job_id is None:
+                return None
+            job_id, self.job_id = self.job_id, None
+            return job_id
+
+    def _warm_playlists(self, sp_client, bpm):
+        from music import RANK_CANDIDATES
+        from playlist_catalog import get_catalog
+        from playlist_ranking import rank_playlists
+        from spotify_cache import search_playlists
+
+        catalog = get_catalog()
+        # Also loads the genre's snapshot that get_spotify_playlist picks from
+        candidates = catalog.sample(self.genre, RANK_CANDIDATES)
+        if not candidates:
+            # Cold miss: search live and seed the catalog, as the playlist page would
+            playlists = asyncio.run(search_playlists(sp_client, self.genre))
+            if playlists:
+                catalog.seed(self.genre, playlists)
+            self.playlists = len(playlists)
+            return
+        self.playlists = len(candidates)
+        if bpm is not None and not self.cancelled:
+            asyncio.run(rank_playlists(sp_client, candidates, bpm))
+
+    def run(self, profile, model, sp_client, reserve_track, generate):
+        from music import (
+            GENRE_PROMPTS, get_api_key, get_job_queue, get_track_pool, predict_favorite_genre
+        )
+
+        try:
+            self.genre = predict_favorite_genre(profile, model)
+            if self.cancelled:
+                return
+            if sp_client is not None:
+                try:
+                    self._warm_playlists(sp_client, (profile or {}).get('BPM'))
+                except Exception as e:
+                    # The playlist page still works cold; go on to reserve a track
+                    self.error = str(e)
+            if self.cancelled or not reserve_track or not get_api_key():
+                return
+            track = get_track_pool().take(self.genre, bpm=(profile or {}).get('BPM'))
+            if track:
+                with self._lock:
+                    if not self.cancelled:
+                        self._track = track
+            elif generate:
+                job_id = get_job_queue().submit(self.user_key, [(GENRE_PROMPTS[self.genre], 1.0)], TRACK_SECONDS)
+                with self._lock:
+                    self.job_id = job_id
+                if self.cancelled:
+                    self.cancel()
+        except Exception as e:
+            self.error = str(e)
+
+
+class Prefetcher:
+    """Bounded pool that runs at most one prefetch per user at a time."""
+
+    def __init__(self, workers=PREFETCH_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def start(self, user_key, profile, model, sp_client=None, reserve_track=True, generate=PREFETCH_GENERATE):
+        """Queue a prefetch for a user and return its handle without waiting."""
+        with self._lock:
+            current = self._active.get(user_key)
+            if current is not None and not current.done and not current.cancelled:
+                return current
+            prefetch = Prefetch(user_key)
+            prefetch.future = self._executor.submit(prefetch.run, profile, model, sp_client, reserve_track, generate)
+            self._active[user_key] = prefetch
+        # Registered outside the lock: an already finished future runs the
+        # callback right here, and _forget takes the lock itself
+        prefetch.future.add_done_callback(lambda _: self._forget(user_key, prefetch))
+        return prefetch
+
+    def _forget(self, user_key, prefetch):
+        with self._lock:
+            if self._active.get(user_key) is prefetch:
+                del self._active[user_key]
+
+    def cancel(self, user_key):
+        with self._lock:
+            prefetch = self._active.pop(user_key, None)
+        if prefetch is not None:
+            prefetch.cancel()
+
+
+@lru_cache(maxsize=1)
+def get_prefetcher():
+    """Return the process-wide prefetcher."""
+    return Prefetcher()
@@ -0,0 +1,181 @@
+# score_users.py
+"""Offline batch scoring of user profiles with the genre model.
+
+Streams profiles from a JSONL or Parquet file in bounded chunks, encodes and
+scores them across a process pool with the same feature schema as
+music.predict_favorite_genre, and streams the results to JSONL or Parquet.
+
+Usage:
+    python score_users.py users.jsonl scores.jsonl --workers 8
+    python score_users.py users.parquet scores.parquet --chunk-size 50000 --probabilities
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from model_registry import MODEL_PATH
+
+DEFAULT_CHUNK_SIZE = 20_000
+
+_worker_model = None
+
+
+def _init_worker(model_path):
+    global _worker_model
+    from model_registry import get_model
+
+    _worker_model = get_model(model_path)
+
+
+def score_chunk(rows, id_field, start, with_probabilities):
+    """Encode and score one chunk of profiles (list of dicts or a DataFrame)."""
+    from features import FEATURE_ENCODER
+    from music import predict_encoded
+
+    if isinstance(rows, list):
+        features = FEATURE_ENCODER.encode(rows)
+        ids = [row.get(id_field, start + i) for i, row in enumerate(rows)]
+    else:
+        features = FEATURE_ENCODER.encode_frame(rows)
+        if id_field in rows:
+            ids = rows[id_field].tolist()
+        else:
+            ids = list(range(start, start + len(rows)))
+
+    genres, probabilities = predict_encoded(features, _worker_model)
+    if not with_probabilities or probabilities is None:
+        probabilities = None
+    return ids, genres, probabilities
+
+
+def read_jsonl(path, chunk_size):
+    with open(path) as f:
+        lines = (line for line in f if line.strip())
+        while True:
+            chunk = [json.loads(line) for line in islice(lines, chunk_size)]
+            if not chunk:
+                return
+            yield chunk
+
+
+def read_parquet(path, chunk_size):
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        yield batch.to_pandas()
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self._file = sys.stdout if str(path) == '-' else open(path, 'w')
+
+    def write(self, ids, genres, probabilities):
+        for i, (user_id, genre) in enumerate(zip(ids, genres)):
+            record = {'id': user_id, 'genre': genre}
+            if probabilities is not None:
+                record['probabilities'] = [round(float(p), 6) for p in probabilities[i]]
+            self._file.write(json.dumps(record) + '\n')
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path):
+        self.path = path
+        self._writer = None
+
+    def write(self, ids, genres, probabilities):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = {'id': pa.array([str(user_id) for user_id in ids]), 'genre': pa.array(genres)}
+        if probabilities is not None:
+            columns['probabilities'] = pa.array(probabilities.tolist(), type=pa.list_(pa.float32()))
+        table = pa.table(columns)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def _is_parquet(path):
+    return Path(path).suffix.lower() in ('.parquet', '.pq')
+
+
+def score_file(input_path, output_path, model_path=MODEL_PATH, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+               id_field='email', with_probabilities=False, report_every=5.0):
+    """Score every profile in input_path and write results to output_path.
+
+    At most 2 * workers chunks are in flight, so memory stays bounded
+    regardless of input size. Results are written in input order.
+
+    Returns:
+        int: Number of profiles scored
+    """
+    workers = workers or os.cpu_count() or 1
+    reader = read_parquet if _is_parquet(input_path) else read_jsonl
+    writer = ParquetWriter(output_path) if _is_parquet(output_path) else JsonlWriter(output_path)
+
+    scored = 0
+    started = last_report = time.perf_counter()
+    pending = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(str(model_path),)) as pool:
+            start = 0
+            for chunk in reader(input_path, chunk_size):
+                pending.append(pool.submit(score_chunk, chunk, id_field, start, with_probabilities))
+                start += len(chunk)
+                while len(pending) >= 2 * workers or (pending and pending[0].done()):
+                    ids, genres, probabilities = pending.pop(0).result()
+                    writer.write(ids, genres, probabilities)
+                    scored += len(ids)
+                    if time.perf_counter() - last_report >= report_every:
+                        last_report = time.perf_counter()
+                        _report(scored, last_report - started)
+            for future in pending:
+                ids, genres, probabilities = future.result()
+                writer.write(ids, genres, probabilities)
+                scored += len(ids)
+    finally:
+        writer.close()
+
+    _report(scored, time.perf_counter() - started, final=True)
+    return scored
+
+
+def _report(scored, elapsed, final=False):
+    rate = scored / elapsed if elapsed else 0.0
+    prefix = "Done:" if final else "Progress:"
+    print(f"{prefix} {scored:,} profiles in {elapsed:.1f}s ({rate:,.0f} profiles/s)", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score user profiles with the genre model.")
+    parser.add_argument("input", help="Profiles as .jsonl or .parquet")
+    parser.add_argument("output", help="Results as .jsonl, .parquet, or - for stdout")
+    parser.add_argument("--model", default=str(MODEL_PATH), help="Model file (pickle, .json/.ubj or .npz)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Profiles per chunk")
+    parser.add_argument("--id-field", default="email", help="Profile field used as the output id")
+    parser.add_argument("--probabilities", action="store_true", help="Include class probabilities")
+    args = parser.parse_args()
+
+    score_file(
+        args.input, args.output, model_path=args.model, workers=args.workers, chunk_size=args.chunk_size,
+        id_field=args.id_field, with_probabilities=args.probabilities
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# spotify_cache.py
+
+import inspect
+import os
+
+from cache import LRUCache
+
+# Spotify's maximum page size; the random pick happens over this candidate set
+SEARCH_LIMIT = 50
+SEARCH_TTL = int(os.environ.get("MUSICREC_SPOTIFY_SEARCH_TTL", 3600))
+# Empty results are retried sooner
+EMPTY_TTL = 60
+
+SEARCH_CACHE = LRUCache(maxsize=256, ttl=SEARCH_TTL)
+
+
+def search_key(query, search_type='playlist', limit=SEARCH_LIMIT, **params):
+    """Key for one search request: query text plus every request parameter."""
+    return ('search', query.strip().lower(), search_type, limit, tuple(sorted(params.items())))
+
+
+def playlist_items(results):
+    """Usable playlists from a search response (Spotify returns nulls for removed ones)."""
+    if not results or not results.get('playlists'):
+        return []
+    return [item for item in results['playlists'].get('items') or [] if item]
+
+
+async def search_playlists(sp_client, query, limit=SEARCH_LIMIT, **params):
+    """Return playlist candidates for a query, from the shared cache when possible.
+
+    Works with the async client from spotify_client or a blocking spotipy client.
+
+    Returns:
+        list: Playlist objects as returned by the Spotify search API
+    """
+    key = search_key(query, 'playlist', limit, **params)
+    items = SEARCH_CACHE.get(key)
+    if items is None:
+        results = sp_client.search(q=query, type='playlist', limit=limit, **params)
+        if inspect.isawaitable(results):
+            results = await results
+        items = playlist_items(results)
+        SEARCH_CACHE.put(key, items, ttl=None if items else EMPTY_TTL)
+    return items
+
+
+def spotify_cache_stats():
+    return SEARCH_CACHE.stats()
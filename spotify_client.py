@@ -0,0 +1,236 @@
+# spotify_client.py
+"""Non-blocking Spotify Web API client with a shared keep-alive connection pool.
+
+AsyncSpotifyClient is a drop-in replacement for the spotipy client passed to
+music.get_spotify_playlist: search() takes the same arguments and returns
+the same JSON, but is awaited instead of blocking the event loop.
+
+Streamlit runs each asyncio.run() on a fresh event loop, and pooled
+connections cannot outlive their loop. As with the Lyria session pool, the
+client therefore owns one long-lived loop on a daemon thread where the
+HTTP connection pool and the access token live. Its methods can be awaited
+from any loop.
+
+The client-credentials token is cached and refreshed `refresh_margin`
+seconds before it expires (or straight away after a 401), with a lock so
+concurrent requests trigger a single refresh.
+
+`api_url` and `token_url` can point at a local stand-in HTTP server for
+testing (MUSICREC_SPOTIFY_API_URL / MUSICREC_SPOTIFY_TOKEN_URL).
+
+Every API call goes through a RequestScheduler (see spotify_scheduler),
+which coalesces identical requests and keeps the client within the rate
+limit instead of failing on 429s. Each API method takes a `priority`;
+background work such as the playlist catalog sync passes BACKGROUND so it
+yields to page requests.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from spotify_scheduler import INTERACTIVE
+
+API_URL = os.environ.get("MUSICREC_SPOTIFY_API_URL", "https://api.spotify.com/v1")
+TOKEN_URL = os.environ.get("MUSICREC_SPOTIFY_TOKEN_URL", "https://accounts.spotify.com/api/token")
+
+
+class SpotifyError(Exception):
+    """A failed Spotify API call.
+
+    Attributes:
+        http_status (int): Response status code
+        retry_after (float): Seconds from the Retry-After header on 429s, else None
+    """
+
+    def __init__(self, http_status, message, retry_after=None):
+        super().__init__(f"Spotify API error {http_status}: {message}")
+        self.http_status = http_status
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header, given as delay-seconds or an HTTP-date.
+
+    Returns:
+        float: Seconds (never negative), or None if the header is missing or unparseable,
+            so the scheduler falls back to its default backoff
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class AsyncSpotifyClient:
+    """Spotify client-credentials API client backed by a pooled httpx.AsyncClient.
+
+    Args:
+        client_id (str): Spotify app client ID
+        client_secret (str): Spotify app client secret
+        max_connections (int): Connection pool size
+        refresh_margin (float): Refresh the token this many seconds before it expires
+        timeout (float): Per-request timeout in seconds
+        scheduler (RequestScheduler): Optional; a default one is created per client
+        transport (httpx.AsyncBaseTransport): Optional transport for the HTTP client,
+            e.g. an httpx.MockTransport in tests
+    """
+
+    def __init__(self, client_id, client_secret, api_url=API_URL, token_url=TOKEN_URL,
+                 max_connections=20, refresh_margin=60.0, timeout=10.0, scheduler=None,
+                 transport=None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.api_url = api_url.rstrip('/')
+        self.token_url = token_url
+        self.max_connections = max_connections
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self._loop = None
+        self._start_lock = threading.Lock()
+        self._http = None
+        self._token = None
+        self._token_expires = 0.0
+        self._token_lock = None
+        self.scheduler = scheduler
+        self.transport = transport
+        self.requests = 0
+        self.token_refreshes = 0
+
+    # --- client loop ---------------------------------------------------
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None:
+                import httpx
+
+                ready = threading.Event()
+
+                def run():
+                    self._loop = asyncio.new_event_loop()
+                    asyncio.set_event_loop(self._loop)
+                    self._http = httpx.AsyncClient(
+                        timeout=self.timeout,
+                        limits=httpx.Limits(
+                            max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_connections
+                        ),
+                        transport=self.transport
+                    )
+                    self._token_lock = asyncio.Lock()
+                    if self.scheduler is None:
+                        from spotify_scheduler import RequestScheduler
+
+                        self.scheduler = RequestScheduler()
+                    ready.set()
+                    self._loop.run_forever()
+
+                threading.Thread(target=run, name="spotify-client", daemon=True).start()
+                ready.wait()
+        return self._loop
+
+    async def _call(self, coro):
+        # Run on the client loop and await the result from the caller's loop;
+        # cancelling the caller cancels the request
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        return await asyncio.wrap_future(future)
+
+    async def _access_token(self, force=False):
+        async with self._token_lock:
+            if not force and self._token and time.monotonic() < self._token_expires - self.refresh_margin:
+                return self._token
+            response = await self._http.post(
+                self.token_url,
+                data={'grant_type': 'client_credentials'},
+                auth=(self.client_id, self.client_secret)
+            )
+            if response.status_code != 200:
+                raise SpotifyError(response.status_code, response.text[:200])
+            payload = response.json()
+            self._token = payload['access_token']
+            self._token_expires = time.monotonic() + payload.get('expires_in', 3600)
+            self.token_refreshes += 1
+            return self._token
+
+    async def _get(self, path, params, priority=INTERACTIVE):
+        key = (path, tuple(sorted(params.items())))
+        return await self.scheduler.run(key, lambda: self._send(path, params), priority)
+
+    async def _send(self, path, params):
+        token = await self._access_token()
+        for attempt in range(2):
+            self.requests += 1
+            response = await self._http.get(
+                f"{self.api_url}/{path}", params=params, headers={'Authorization': f"Bearer {token}"}
+            )
+            if response.status_code == 401 and attempt == 0:
+                # Token revoked or expired early; refresh once and retry
+                token = await self._access_token(force=True)
+                continue
+            break
+        if response.status_code == 429:
+            raise SpotifyError(429, "rate limited", parse_retry_after(response.headers.get('Retry-After')))
+        if response.status_code >= 400:
+            raise SpotifyError(response.status_code, response.text[:200])
+        return response.json()
+
+    # --- API -----------------------------------------------------------
+
+    async def search(self, q, limit=10, offset=0, type='track', market=None, priority=INTERACTIVE):
+        """Search the catalog; same arguments and response as spotipy's search()."""
+        params = {'q': q, 'limit': limit, 'offset': offset, 'type': type}
+        if market:
+            params['market'] = market
+        return await self._call(self._get('search', params, priority))
+
+    async def playlist(self, playlist_id, fields=None, market=None, priority=INTERACTIVE):
+        """Get a playlist's metadata; same arguments and response as spotipy's playlist()."""
+        params = {}
+        if fields:
+            params['fields'] = fields
+        if market:
+            params['market'] = market
+        return await self._call(self._get(f"playlists/{playlist_id}", params, priority))
+
+    async def playlist_items(self, playlist_id, fields=None, limit=100, offset=0, market=None,
+                             priority=INTERACTIVE):
+        """Get a page of a playlist's tracks; same arguments and response as spotipy's playlist_items()."""
+        params = {'limit': limit, 'offset': offset}
+        if fields:
+            params['fields'] = fields
+        if market:
+            params['market'] = market
+        return await self._call(self._get(f"playlists/{playlist_id}/tracks", params, priority))
+
+    async def audio_features(self, tracks, priority=INTERACTIVE):
+        """Get audio features for up to 100 track IDs; returns a list like spotipy's audio_features()."""
+        results = await self._call(self._get('audio-features', {'ids': ','.join(tracks)}, priority))
+        return results.get('audio_features') or []
+
+    def close(self):
+        """Close pooled connections and stop the client loop."""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._http.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'token_refreshes': self.token_refreshes,
+            'token_valid_for': max(self._token_expires - time.monotonic(), 0.0) if self._token else 0.0,
+            'scheduler': self.scheduler.stats() if self.scheduler is not None else None
+        }
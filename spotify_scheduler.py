@@ -0,0 +1,169 @@
+# spotify_scheduler.py
+"""Rate-limit-aware scheduling for Spotify API requests.
+
+RequestScheduler sits in front of every upstream call made by
+AsyncSpotifyClient and runs on the client's event loop:
+
+  - identical requests already in flight are coalesced into one upstream
+    call whose result every caller shares
+  - calls pass through a token bucket sized to the app's quota, so bursts
+    wait in a queue instead of triggering 429s
+  - a 429 pauses every request for the Retry-After period plus jitter;
+    429s without Retry-After and 5xx errors retry with jittered
+    exponential backoff
+  - BACKGROUND requests (e.g. the playlist catalog sync) only go out while
+    no interactive request is waiting, and never dip into the last
+    `reserve` tokens, so a sync cannot starve page requests
+"""
+
+import asyncio
+import os
+import random
+import time
+
+# Sustained requests per second and burst size for the app's quota
+SPOTIFY_RATE = float(os.environ.get("MUSICREC_SPOTIFY_RATE", 5))
+SPOTIFY_BURST = int(os.environ.get("MUSICREC_SPOTIFY_BURST", 10))
+# Tokens background requests leave in the bucket for interactive ones
+SPOTIFY_RESERVE = int(os.environ.get("MUSICREC_SPOTIFY_RESERVE", SPOTIFY_BURST // 2))
+
+# Priorities: lower goes first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class RequestScheduler:
+    """Coalescing token-bucket scheduler with Retry-After aware retries.
+
+    Args:
+        rate (float): Tokens added per second
+        burst (int): Bucket capacity
+        reserve (int): Tokens background requests leave for interactive ones
+        max_retries (int): Retries after a 429 or 5xx before the error is raised
+        base_backoff (float): First backoff in seconds when no Retry-After is given
+        max_backoff (float): Upper bound for a single backoff
+    """
+
+    def __init__(self, rate=SPOTIFY_RATE, burst=SPOTIFY_BURST, reserve=SPOTIFY_RESERVE, max_retries=5,
+                 base_backoff=0.5, max_backoff=30.0):
+        self.rate = rate
+        self.burst = burst
+        self.reserve = min(reserve, burst - 1)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._gate = asyncio.Lock()
+        self._background_gate = asyncio.Lock()
+        self._inflight = {}
+        self._interactive_waiting = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.requests = 0
+        self.background_requests = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.throttled = 0
+        self.throttle_time = 0.0
+        self.wait_time = 0.0
+
+    async def run(self, key, request, priority=INTERACTIVE):
+        """Run `request()` (a coroutine function) once per key at a time, within the rate limit.
+
+        Args:
+            key: Hashable identity of the request, for coalescing
+            request: Coroutine function making the upstream call
+            priority (int): INTERACTIVE or BACKGROUND
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._execute(request, priority))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # A cancelled caller must not cancel the shared call for everyone else
+        return await asyncio.shield(task)
+
+    async def _acquire(self, priority):
+        started = time.monotonic()
+        background = priority == BACKGROUND
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        if not background:
+            self._interactive_waiting += 1
+        try:
+            # Each lock is FIFO, so requests of one priority go out in arrival order
+            async with self._background_gate if background else self._gate:
+                while True:
+                    now = time.monotonic()
+                    if now < self._paused_until:
+                        await asyncio.sleep(self._paused_until - now)
+                        continue
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if background:
+                        # Yield to waiting page requests and keep a burst's worth of tokens for them
+                        floor = 1 + self.reserve
+                        if self._tokens >= floor and not self._interactive_waiting:
+                            self._tokens -= 1
+                            return
+                        await asyncio.sleep(max(floor - self._tokens, 1) / self.rate)
+                    else:
+                        if self._tokens >= 1:
+                            self._tokens -= 1
+                            return
+                        await asyncio.sleep((1 - self._tokens) / self.rate)
+        finally:
+            self.queue_depth -= 1
+            if not background:
+                self._interactive_waiting -= 1
+            self.wait_time += time.monotonic() - started
+
+    def _backoff(self, attempt, retry_after):
+        ceiling = min(self.max_backoff, self.base_backoff * 2 ** attempt)
+        if retry_after is not None:
+            # Honor the server's delay; jitter keeps waiting callers from retrying in lockstep
+            return retry_after + random.uniform(0, min(ceiling, 1.0))
+        return random.uniform(ceiling / 2, ceiling)
+
+    async def _execute(self, request, priority):
+        from spotify_client import SpotifyError
+
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(priority)
+            self.requests += 1
+            if priority == BACKGROUND:
+                self.background_requests += 1
+            try:
+                return await request()
+            except SpotifyError as e:
+                retryable = e.http_status == 429 or e.http_status >= 500
+                if not retryable or attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e.retry_after)
+                if e.http_status == 429:
+                    # The quota is per app, so hold back every request, not just this one
+                    self.throttled += 1
+                    self.throttle_time += delay
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                    self._tokens = 0.0
+                else:
+                    await asyncio.sleep(delay)
+                self.retries += 1
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'in_flight': len(self._inflight),
+            'requests': self.requests,
+            'background_requests': self.background_requests,
+            'coalesced': self.coalesced,
+            'retries': self.retries,
+            'throttled': self.throttled,
+            'throttle_time': self.throttle_time,
+            'wait_time': self.wait_time
+        }
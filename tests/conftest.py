@@ -0,0 +1,8 @@
+# tests/conftest.py
+
+import sys
+from pathlib import Path
+
+# The app is a set of flat top-level modules, not a package
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
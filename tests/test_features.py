@@ -0,0 +1,43 @@
+# tests/test_features.py
+"""Row-wise and column-wise profile encoding must agree."""
+
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+
+from features import FEATURE_ENCODER, random_profiles  # noqa: E402
+
+# Values a profile field can hold once it has been through a table or a form
+BLANKS = [math.nan, np.float64('nan'), None, "nan", "NaN", ""]
+
+
+def profiles_with_blanks(n, seed=0):
+    rng = np.random.default_rng(seed)
+    profiles = list(random_profiles(n, seed=seed))
+    keys = sorted({key for profile in profiles for key in profile})
+    for profile in profiles:
+        for key in rng.choice(keys, size=3, replace=False):
+            if rng.random() < 0.2:
+                del profile[key]
+            else:
+                profile[key] = BLANKS[rng.integers(len(BLANKS))]
+    return profiles
+
+
+def test_encode_matches_encode_frame():
+    profiles = profiles_with_blanks(2000, seed=3)
+    rows = FEATURE_ENCODER.encode(profiles)
+    columns = FEATURE_ENCODER.encode_frame(pd.DataFrame(profiles))
+    np.testing.assert_array_equal(rows, columns)
+
+
+def test_nan_falls_back_to_default():
+    rows = FEATURE_ENCODER.encode([{'Age': math.nan, 'BPM': "nan", 'Anxiety': 7}])
+    names = FEATURE_ENCODER.names
+    assert not np.isnan(rows).any()
+    assert rows[0, names.index('Age')] == 25
+    assert rows[0, names.index('BPM')] == 120
+    assert rows[0, names.index('Anxiety')] == 7
@@ -0,0 +1,281 @@
+# tests/test_lyria_pool.py
+"""LyriaSessionPool against a local stand-in WebSocket server.
+
+The stand-in speaks a minimal JSON control protocol (prompts, config,
+play, stop) and streams binary PCM frames while playing, which is all the
+pool relies on. The client side wraps each connection in an object with
+the same methods as a google-genai live music session.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+websockets = pytest.importorskip("websockets")
+
+from websockets.asyncio.client import connect as ws_connect  # noqa: E402
+from websockets.asyncio.server import serve  # noqa: E402
+from websockets.exceptions import ConnectionClosed  # noqa: E402
+
+from lyria_pool import LyriaSessionPool  # noqa: E402
+
+CHUNK_BYTES = 1920
+
+
+class StandInLyriaServer:
+    """Lyria-like WebSocket server on its own loop thread, counting connections and plays."""
+
+    def __init__(self):
+        self.connections = 0
+        self.playing = 0
+        self.peak_playing = 0
+        self.prompts = []
+        self._sockets = set()
+        self._loop = asyncio.new_event_loop()
+        self._server = None
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._server = self._run(self._serve())
+        self.url = f"ws://127.0.0.1:{self._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def _serve(self):
+        return await serve(self._handle, "127.0.0.1", 0)
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(5)
+
+    async def _handle(self, ws):
+        self.connections += 1
+        self._sockets.add(ws)
+        streamer = None
+        try:
+            async for raw in ws:
+                message = json.loads(raw)
+                if message['type'] == 'prompts':
+                    self.prompts.append(message['prompts'])
+                elif message['type'] == 'play' and streamer is None:
+                    self.playing += 1
+                    self.peak_playing = max(self.peak_playing, self.playing)
+                    streamer = asyncio.create_task(self._stream(ws))
+                elif message['type'] == 'stop' and streamer is not None:
+                    streamer.cancel()
+                    streamer = None
+                    self.playing -= 1
+        except ConnectionClosed:
+            pass
+        finally:
+            if streamer is not None:
+                streamer.cancel()
+                self.playing -= 1
+            self._sockets.discard(ws)
+
+    async def _stream(self, ws):
+        while True:
+            await ws.send(bytes(CHUNK_BYTES))
+            await asyncio.sleep(0.005)
+
+    def drop_connections(self):
+        """Close every open connection from the server side."""
+        async def close_all():
+            for ws in list(self._sockets):
+                await ws.close()
+
+        self._run(close_all())
+
+    def stop(self):
+        self._server.close()
+        self._run(self._server.wait_closed())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+class StandInSession:
+    """Client side of the stand-in protocol, shaped like a live music session."""
+
+    def __init__(self, ws):
+        self.ws = ws
+
+    async def _send(self, **message):
+        await self.ws.send(json.dumps(message))
+
+    async def set_weighted_prompts(self, prompts):
+        await self._send(type='prompts', prompts=list(prompts))
+
+    async def set_music_generation_config(self, config):
+        await self._send(type='config', config=config)
+
+    async def play(self):
+        await self._send(type='play')
+
+    async def stop(self):
+        await self._send(type='stop')
+
+    async def receive(self):
+        try:
+            async for raw in self.ws:
+                chunk = SimpleNamespace(data=raw)
+                yield SimpleNamespace(server_content=SimpleNamespace(audio_chunks=[chunk]))
+        except ConnectionClosed:
+            return
+
+
+def stand_in_connect(url):
+    @asynccontextmanager
+    async def session():
+        async with ws_connect(url) as ws:
+            yield StandInSession(ws)
+
+    return session
+
+
+@pytest.fixture
+def server():
+    server = StandInLyriaServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_pool(server):
+    pools = []
+
+    def make_pool(**kwargs):
+        pool = LyriaSessionPool(stand_in_connect(server.url), **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make_pool
+    for pool in pools:
+        pool.close_all()
+
+
+async def take_chunks(pool, count, prompt="jazz"):
+    stream = pool.stream([prompt])
+    chunks = []
+    async for chunk in stream:
+        chunks.append(chunk)
+        if len(chunks) == count:
+            break
+    await stream.aclose()
+    return chunks
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.01)
+
+
+def test_session_is_reused(server, make_pool):
+    pool = make_pool(max_size=2)
+    for prompt in ("jazz", "rock", "lofi"):
+        assert len(asyncio.run(take_chunks(pool, 3, prompt))) == 3
+        wait_until(lambda: pool.stats()['idle'] == 1)
+
+    assert server.connections == 1
+    assert pool.stats()['created'] == 1
+    assert pool.stats()['reused'] == 2
+    assert server.prompts == [["jazz"], ["rock"], ["lofi"]]
+    # Playback is stopped when a request hands its session back
+    wait_until(lambda: server.playing == 0)
+
+
+def test_reuse_is_reported_in_metrics(server, make_pool):
+    pool = make_pool()
+
+    async def run():
+        metrics = {}
+        stream = pool.stream(["jazz"], metrics=metrics)
+        await stream.__anext__()
+        await stream.aclose()
+        return metrics
+
+    first = asyncio.run(run())
+    wait_until(lambda: pool.stats()['idle'] == 1)
+    second = asyncio.run(run())
+    assert first['session_reused'] is False
+    assert second['session_reused'] is True
+    assert second['connect_time'] >= 0
+
+
+def test_unhealthy_session_is_replaced(server, make_pool):
+    pool = make_pool()
+    asyncio.run(take_chunks(pool, 2))
+    wait_until(lambda: pool.stats()['idle'] == 1)
+
+    server.drop_connections()
+    # The reader task notices the closed socket and the session stops counting as alive
+    wait_until(lambda: not pool._idle[0].alive)
+
+    assert len(asyncio.run(take_chunks(pool, 2))) == 2
+    assert server.connections == 2
+    assert pool.stats()['created'] == 2
+    assert pool.stats()['closed'] >= 1
+
+
+def test_max_age_closes_old_sessions(server, make_pool):
+    pool = make_pool(max_age=0.3, health_interval=60)
+    asyncio.run(take_chunks(pool, 2))
+    wait_until(lambda: pool.stats()['idle'] == 1)
+    time.sleep(0.4)
+
+    asyncio.run(take_chunks(pool, 2))
+    assert server.connections == 2
+    assert pool.stats()['reused'] == 0
+
+
+def test_idle_timeout_closes_idle_sessions(server, make_pool):
+    pool = make_pool(idle_timeout=0.2, health_interval=0.05)
+    asyncio.run(take_chunks(pool, 2))
+    wait_until(lambda: pool.stats()['created'] == 1)
+
+    # The janitor closes the session once it has sat idle too long
+    wait_until(lambda: pool.stats()['closed'] == 1 and pool.stats()['idle'] == 0)
+    wait_until(lambda: not server._sockets)
+
+    asyncio.run(take_chunks(pool, 2))
+    assert server.connections == 2
+
+
+def test_failed_request_closes_its_session(server, make_pool):
+    pool = make_pool()
+
+    async def fail():
+        async for _ in pool.stream(["jazz"]):
+            raise RuntimeError("caller gave up")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(fail())
+    wait_until(lambda: pool.stats()['closed'] == 1)
+    assert pool.stats()['idle'] == 0
+
+
+def test_slots_limit_concurrent_sessions(server, make_pool):
+    pool = make_pool(max_size=1)
+
+    async def run():
+        first = pool.stream(["jazz"])
+        await first.__anext__()
+        second = pool.stream(["rock"])
+        waiting = asyncio.ensure_future(second.__anext__())
+        await asyncio.sleep(0.2)
+        # The second request waits for the only slot instead of opening a session
+        assert not waiting.done()
+        assert server.connections == 1
+        await first.aclose()
+        await asyncio.wait_for(waiting, 5)
+        await second.aclose()
+
+    asyncio.run(run())
+    assert server.peak_playing == 1
+    assert server.connections == 1
+    assert pool.stats()['reused'] == 1
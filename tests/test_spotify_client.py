@@ -0,0 +1,185 @@
+# tests/test_spotify_client.py
+"""AsyncSpotifyClient token handling and retries against an httpx.MockTransport.
+
+The stand-in handler answers the token endpoint with numbered tokens and
+hands API requests to a per-test responder, recording every request so
+tests can count token refreshes and upstream calls.
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+import spotify_client  # noqa: E402
+from spotify_client import AsyncSpotifyClient, SpotifyError, parse_retry_after  # noqa: E402
+from spotify_scheduler import BACKGROUND, RequestScheduler  # noqa: E402
+
+API_URL = "https://api.test/v1"
+TOKEN_URL = "https://accounts.test/api/token"
+SEARCH_RESULT = {'playlists': {'items': []}}
+
+
+class StandInSpotify:
+    """MockTransport handler issuing tokens t1, t2, ... and recording API calls."""
+
+    def __init__(self, respond, expires_in=3600):
+        self.respond = respond
+        self.expires_in = expires_in
+        self.tokens = 0
+        self.api_calls = []
+
+    def __call__(self, request):
+        if str(request.url) == TOKEN_URL:
+            self.tokens += 1
+            return httpx.Response(200, json={'access_token': f"t{self.tokens}", 'expires_in': self.expires_in})
+        token = request.headers['Authorization'].removeprefix("Bearer ")
+        self.api_calls.append((time.monotonic(), token))
+        return self.respond(len(self.api_calls), token)
+
+
+def ok(call, token):
+    return httpx.Response(200, json=SEARCH_RESULT)
+
+
+@pytest.fixture
+def make_client():
+    clients = []
+
+    def make_client(handler, **kwargs):
+        kwargs.setdefault('scheduler', RequestScheduler(base_backoff=0.01, max_backoff=0.05))
+        client = AsyncSpotifyClient(
+            "id", "secret", api_url=API_URL, token_url=TOKEN_URL,
+            transport=httpx.MockTransport(handler), **kwargs
+        )
+        clients.append(client)
+        return client
+
+    yield make_client
+    for client in clients:
+        client.close()
+
+
+def search(client, q="jazz"):
+    return asyncio.run(client.search(q=q, type='playlist'))
+
+
+def test_token_is_reused_until_refresh_margin(make_client, monkeypatch):
+    # The client reads token expiry from a clock the test moves by hand
+    now = [1000.0]
+    monkeypatch.setattr(spotify_client, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    spotify = StandInSpotify(ok, expires_in=3600)
+    client = make_client(spotify, refresh_margin=60.0)
+
+    search(client, "jazz")
+    now[0] += 3500
+    search(client, "rock")
+    assert spotify.tokens == 1
+
+    # Past expires_in - refresh_margin the token is refreshed before it can expire
+    now[0] += 41
+    search(client, "lofi")
+    assert spotify.tokens == 2
+    assert [token for _, token in spotify.api_calls] == ["t1", "t1", "t2"]
+    assert client.stats()['token_refreshes'] == 2
+
+
+def test_401_refreshes_token_and_retries_once(make_client):
+    def respond(call, token):
+        return httpx.Response(401) if token == "t1" else ok(call, token)
+
+    spotify = StandInSpotify(respond)
+    client = make_client(spotify)
+
+    assert search(client) == SEARCH_RESULT
+    assert spotify.tokens == 2
+    assert [token for _, token in spotify.api_calls] == ["t1", "t2"]
+
+
+def test_repeated_401_is_raised_after_one_retry(make_client):
+    spotify = StandInSpotify(lambda call, token: httpx.Response(401, text="revoked"))
+    client = make_client(spotify)
+
+    with pytest.raises(SpotifyError) as error:
+        search(client)
+    assert error.value.http_status == 401
+    assert len(spotify.api_calls) == 2
+    assert spotify.tokens == 2
+
+
+def test_429_waits_for_retry_after_seconds(make_client):
+    def respond(call, token):
+        return httpx.Response(429, headers={'Retry-After': "0.3"}) if call == 1 else ok(call, token)
+
+    spotify = StandInSpotify(respond)
+    client = make_client(spotify)
+
+    assert search(client) == SEARCH_RESULT
+    (first, _), (second, _) = spotify.api_calls
+    assert second - first >= 0.3
+    assert client.scheduler.stats()['throttled'] == 1
+
+
+def test_429_waits_for_retry_after_http_date(make_client):
+    retry_at = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(seconds=2)
+
+    def respond(call, token):
+        if call == 1:
+            return httpx.Response(429, headers={'Retry-After': format_datetime(retry_at, usegmt=True)})
+        return ok(call, token)
+
+    spotify = StandInSpotify(respond)
+    client = make_client(spotify)
+
+    assert search(client) == SEARCH_RESULT
+    assert len(spotify.api_calls) == 2
+    # The retry is held back until the date the server gave
+    assert datetime.now(timezone.utc) >= retry_at
+    assert client.scheduler.stats()['throttled'] == 1
+
+
+def test_429_with_unparseable_retry_after_backs_off(make_client):
+    def respond(call, token):
+        return httpx.Response(429, headers={'Retry-After': "soon"}) if call == 1 else ok(call, token)
+
+    spotify = StandInSpotify(respond)
+    client = make_client(spotify)
+
+    assert search(client) == SEARCH_RESULT
+    assert len(spotify.api_calls) == 2
+
+
+def test_background_requests_yield_to_interactive(make_client):
+    spotify = StandInSpotify(ok)
+    client = make_client(spotify, scheduler=RequestScheduler(rate=20, burst=4, reserve=2))
+
+    async def run():
+        syncing = [
+            asyncio.ensure_future(client.playlist(f"p{i}", fields='followers.total', priority=BACKGROUND))
+            for i in range(20)
+        ]
+        await asyncio.sleep(0.1)
+        await client.search(q="jazz", type='playlist')
+        done = sum(task.done() for task in syncing)
+        await asyncio.gather(*syncing)
+        return done
+
+    # The page request jumps the sync's queue instead of waiting behind all 20 lookups
+    assert asyncio.run(run()) < 10
+    assert client.scheduler.stats()['background_requests'] == 20
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    # Dates in the past mean retry now
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 28 <= parse_retry_after(later) <= 30
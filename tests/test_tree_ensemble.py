@@ -0,0 +1,58 @@
+# tests/test_tree_ensemble.py
+
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("xgboost")
+
+from model_registry import load_model_file
+from tree_ensemble import TreeEnsemble, export, verification_grid
+
+MODEL_PATH = Path(__file__).resolve().parent.parent / "best_xgb"
+
+
+@pytest.fixture(scope="module")
+def exported(tmp_path_factory):
+    out_path = tmp_path_factory.mktemp("trees") / "best_xgb.trees.npz"
+    export(MODEL_PATH, out_path)
+    return out_path
+
+
+@pytest.fixture(scope="module")
+def xgb_model():
+    return load_model_file(MODEL_PATH)
+
+
+@pytest.fixture(scope="module")
+def grid():
+    return verification_grid(num_profiles=3000, num_random=3000, seed=7)
+
+
+def test_probabilities_match_xgboost(exported, xgb_model, grid):
+    ensemble = TreeEnsemble.load(exported)
+    expected = np.asarray(xgb_model.predict_proba(grid))
+    actual = ensemble.predict_proba(grid)
+    assert actual.shape == expected.shape
+    np.testing.assert_allclose(actual, expected, atol=1e-5)
+
+
+def test_classes_match_xgboost(exported, xgb_model, grid):
+    ensemble = TreeEnsemble.load(exported)
+    np.testing.assert_array_equal(ensemble.predict(grid), np.asarray(xgb_model.predict(grid)))
+
+
+def test_single_row_matches_batch(exported, grid):
+    ensemble = TreeEnsemble.load(exported)
+    batch = ensemble.predict_proba(grid[:50])
+    rows = np.vstack([ensemble.predict_proba(grid[i:i + 1]) for i in range(50)])
+    np.testing.assert_allclose(rows, batch, atol=1e-6)
+
+
+def test_registry_serves_exported_trees(exported, xgb_model, grid):
+    handle = load_model_file(exported)
+    assert handle.format == "trees"
+    np.testing.assert_allclose(
+        handle.predict_proba(grid[:500]), np.asarray(xgb_model.predict_proba(grid[:500])), atol=1e-5
+    )
@@ -0,0 +1,373 @@
+# track_cache.py
+"""On-disk, content-addressed cache of generated tracks with a pre-warmed pool per genre.
+
+Tracks are grouped by a request key derived from (prompt text, duration,
+audio format, generator version) and stored under the SHA-256 of their bytes:
+
+    <root>/<request key>/ready/<sha256>.<format>          generated, not yet served
+    <root>/<request key>/ready/<sha256>.<format>.<codec>  optional compressed copy
+    <root>/<request key>/served/<sha256>.<format>         handed out at least once
+
+take() moves a ready track to served with an atomic rename, so each pooled
+track goes to exactly one request even across threads and processes.
+Ready tracks older than `max_age` are stale (generated before a prompt or
+model change that the key does not capture) and are never served.
+Total size is bounded with least-recently-used eviction; stale tracks go
+first, then served ones, then ready ones.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+TRACK_CACHE_DIR = Path(os.environ.get("MUSICREC_TRACK_CACHE", ".track_cache"))
+TRACK_CACHE_MAX_BYTES = int(os.environ.get("MUSICREC_TRACK_CACHE_MAX_BYTES", 512 * 2**20))
+# Fresh tracks kept ready per genre; 0 disables the warmer
+POOL_SIZE_PER_GENRE = int(os.environ.get("MUSICREC_TRACK_POOL_SIZE", 2))
+# Ready tracks older than this are not served
+TRACK_MAX_AGE = int(os.environ.get("MUSICREC_TRACK_MAX_AGE", 24 * 3600))
+
+READY = "ready"
+SERVED = "served"
+
+
+def request_key(prompt_text, duration_seconds, audio_format, version=""):
+    """Key identifying interchangeable tracks: same prompt, duration, format and generator."""
+    raw = f"{prompt_text}\0{duration_seconds}\0{audio_format}\0{version}".encode()
+    return hashlib.sha256(raw).hexdigest()[:32]
+
+
+class TrackCache:
+    """Size-bounded, content-addressed track store shared by every session.
+
+    Args:
+        root (Path): Cache directory
+        max_bytes (int): Total size bound, including compressed copies
+        max_age (float): Seconds a ready track stays servable after it is generated
+        version (str): Generator version (e.g. the Lyria model) mixed into every key
+    """
+
+    def __init__(self, root=TRACK_CACHE_DIR, max_bytes=TRACK_CACHE_MAX_BYTES, max_age=TRACK_MAX_AGE, version=""):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.version = version
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _dir(self, key, state):
+        return self.root / key / state
+
+    def _key(self, prompt_text, duration_seconds, audio_format):
+        return request_key(prompt_text, duration_seconds, audio_format, self.version)
+
+    def _stale(self, path, now=None):
+        # A ready file is written once, so its mtime is its creation time
+        return path.parent.name == READY and (now or time.time()) - _mtime(path) > self.max_age
+
+    def _ready(self, key, audio_format):
+        now = time.time()
+        return [p for p in self._dir(key, READY).glob(f"*.{audio_format}") if not self._stale(p, now)]
+
+    def put(self, prompt_text, duration_seconds, audio_format, data, state=READY, encoded=None, encoded_format=None):
+        """Store a track and return its content digest. Identical bytes are stored once.
+
+        Args:
+            encoded (bytes): Optional compressed copy of the track, served alongside it
+            encoded_format (str): Format of `encoded`, e.g. 'mp3'
+        """
+        key = self._key(prompt_text, duration_seconds, audio_format)
+        digest = hashlib.sha256(data).hexdigest()
+        directory = self._dir(key, state)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{digest}.{audio_format}"
+        if not path.exists() and not (self._dir(key, READY if state == SERVED else SERVED) / path.name).exists():
+            # The compressed copy lands first, so a visible track always has it;
+            # temp names keep readers from seeing a partial file
+            if encoded and encoded_format:
+                _write_atomic(directory, path.with_name(f"{path.name}.{encoded_format}"), encoded)
+            _write_atomic(directory, path, data)
+            self.evict()
+        return digest
+
+    def take(self, prompt_text, duration_seconds, audio_format, digest=None):
+        """Claim a fresh ready track, moving it to served.
+
+        With `digest`, only that specific track is claimed.
+
+        Returns:
+            dict: 'digest', 'data', 'encoded' bytes (or None) and 'encoded_format',
+            or None if no fresh track is ready
+        """
+        key = self._key(prompt_text, duration_seconds, audio_format)
+        ready = self._dir(key, READY)
+        served = self._dir(key, SERVED)
+        if digest is not None:
+            candidates = [ready / f"{digest}.{audio_format}"]
+        else:
+            candidates = sorted(ready.glob(f"*.{audio_format}"), key=_mtime)
+        for path in candidates:
+            if self._stale(path):
+                if self._remove(path):
+                    with self._lock:
+                        self.expired += 1
+                continue
+            served.mkdir(parents=True, exist_ok=True)
+            target = served / path.name
+            try:
+                os.replace(path, target)
+            except FileNotFoundError:
+                # Another request claimed it first
+                continue
+            os.utime(target)
+            entry = {'digest': target.name.split('.')[0], 'data': target.read_bytes(), 'encoded': None, 'encoded_format': None}
+            for sidecar in ready.glob(f"{path.name}.*"):
+                try:
+                    moved = served / sidecar.name
+                    os.replace(sidecar, moved)
+                    entry['encoded'] = moved.read_bytes()
+                    entry['encoded_format'] = moved.name.rsplit('.', 1)[1]
+                except FileNotFoundError:
+                    pass
+            with self._lock:
+                self.hits += 1
+            return entry
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def ready_count(self, prompt_text, duration_seconds, audio_format):
+        return len(self._ready(self._key(prompt_text, duration_seconds, audio_format), audio_format))
+
+    def ready_digests(self, prompt_text, duration_seconds, audio_format):
+        key = self._key(prompt_text, duration_seconds, audio_format)
+        return [p.stem for p in self._ready(key, audio_format)]
+
+    def _files(self):
+        return [p for p in self.root.glob("*/*/*") if p.is_file() and not p.name.startswith('.')]
+
+    def track_paths(self):
+        """Every stored track, ready or served, without compressed copies."""
+        return [p for p in self._files() if p.name.count('.') == 1]
+
+    def _remove(self, path):
+        """Delete a track and its compressed copies; returns the bytes freed."""
+        freed = 0
+        for file in [path, *path.parent.glob(f"{path.name}.*")]:
+            try:
+                size = file.stat().st_size
+                file.unlink()
+            except FileNotFoundError:
+                continue
+            freed += size
+        return freed
+
+    def evict(self):
+        """Delete stale ready tracks, then least recently used ones until the cache fits in max_bytes."""
+        with self._lock:
+            files = self._files()
+            total = sum(_size(p) for p in files)
+            now = time.time()
+            # Stale first, then served tracks, each oldest access first
+            tracks = sorted(
+                (p for p in files if p.name.count('.') == 1),
+                key=lambda p: (not self._stale(p, now), p.parent.name != SERVED, _mtime(p))
+            )
+            removed = 0
+            for path in tracks:
+                stale = self._stale(path, now)
+                if total <= self.max_bytes and not stale:
+                    break
+                freed = self._remove(path)
+                if freed:
+                    total -= freed
+                    removed += 1
+                    self.evicted += 1
+                    if stale:
+                        self.expired += 1
+            return removed
+
+    def stats(self):
+        files = self._files()
+        tracks = [p for p in files if p.name.count('.') == 1]
+        now = time.time()
+        with self._lock:
+            return {
+                'tracks': len(tracks),
+                'ready': sum(1 for p in tracks if p.parent.name == READY and not self._stale(p, now)),
+                'bytes': sum(_size(p) for p in files),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evicted': self.evicted
+            }
+
+
+def _write_atomic(directory, path, data):
+    tmp = directory / f".{uuid.uuid4().hex}.tmp"
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _mtime(path):
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def _size(path):
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+class TrackPoolWarmer:
+    """Background thread that keeps `pool_size` ready tracks per genre.
+
+    Args:
+        cache (TrackCache): Where generated tracks are stored
+        prompts (dict): Genre name -> prompt text
+        generate: Coroutine function (genre, duration_seconds) -> track bytes or None
+        pool_size (int): Ready tracks to keep per genre
+        duration_seconds (int): Length of pooled tracks
+        audio_format (str): Format of the bytes returned by `generate`
+        analyzer (TrackAnalyzer): Optional; analyzes each new track so take()
+            can pick by tempo, and has its index pruned when the cache removes tracks
+        encode: Optional function (track bytes) -> compressed bytes, run on the
+            warmer thread so take() can serve a compressed copy without encoding
+        encoded_format (str): Format of the bytes returned by `encode`, e.g. 'mp3'
+    """
+
+    def __init__(self, cache, prompts, generate, pool_size=POOL_SIZE_PER_GENRE,
+                 duration_seconds=10, audio_format="wav", retry_seconds=30, analyzer=None,
+                 encode=None, encoded_format=None):
+        self.cache = cache
+        self.prompts = prompts
+        self.generate = generate
+        self.pool_size = pool_size
+        self.duration_seconds = duration_seconds
+        self.audio_format = audio_format
+        self.retry_seconds = retry_seconds
+        self.analyzer = analyzer
+        self.encode = encode
+        self.encoded_format = encoded_format
+        self.generated = 0
+        self.failures = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the warmer thread once; later calls just wake it up."""
+        with self._start_lock:
+            if self.pool_size > 0 and (self._thread is None or not self._thread.is_alive()):
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="track-pool-warmer", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def take(self, genre, bpm=None):
+        """Serve a pooled track for a genre if one is ready, and trigger a refill.
+        
+        With `bpm` and an analyzer, the ready track whose tempo is closest to
+        it is served; tracks not analyzed yet are only used as a fallback.
+
+        Returns:
+            dict: 'wav' bytes, 'compressed' bytes or None and 'audio_format',
+            or None if no track is ready
+        """
+        prompt_text = self.prompts.get(genre)
+        if not prompt_text:
+            return None
+        entry = None
+        if bpm is not None and self.analyzer is not None:
+            digests = self.cache.ready_digests(prompt_text, self.duration_seconds, self.audio_format)
+            digest = self.analyzer.index.closest(bpm, digests)
+            if digest is not None:
+                entry = self.cache.take(prompt_text, self.duration_seconds, self.audio_format, digest=digest)
+        if entry is None:
+            entry = self.cache.take(prompt_text, self.duration_seconds, self.audio_format)
+        self._wake.set()
+        if entry is None:
+            return None
+        return {'wav': entry['data'], 'compressed': entry['encoded'], 'audio_format': entry['encoded_format']}
+
+    def _deficits(self):
+        return [
+            genre for genre, prompt_text in self.prompts.items()
+            if self.cache.ready_count(prompt_text, self.duration_seconds, self.audio_format) < self.pool_size
+        ]
+
+    def _run(self):
+        asyncio.run(self._fill_forever())
+
+    def _removals(self):
+        return self.cache.evicted + self.cache.expired
+
+    def _prune_index(self):
+        # Tracks removed by eviction or expiry have no use in the tempo index
+        self.analyzer.prune(p.stem for p in self.cache.track_paths())
+
+    async def _fill_forever(self):
+        # This thread only runs the warmer, so blocking waits on its loop are fine
+        if self.analyzer is not None:
+            # Drop rows for tracks removed while the app was not running
+            self._prune_index()
+        removals = self._removals()
+        while not self._stop.is_set():
+            self._wake.clear()
+            missing = self._deficits()
+            if not missing:
+                self._wake.wait()
+                continue
+            # Most depleted genre first
+            genre = min(missing, key=lambda g: self.cache.ready_count(
+                self.prompts[g], self.duration_seconds, self.audio_format))
+            try:
+                data = await self.generate(genre, self.duration_seconds)
+            except Exception:
+                data = None
+            if data:
+                encoded = None
+                if self.encode is not None:
+                    try:
+                        encoded = await asyncio.to_thread(self.encode, data)
+                    except Exception:
+                        # Served uncompressed instead
+                        encoded = None
+                digest = self.cache.put(
+                    self.prompts[genre], self.duration_seconds, self.audio_format, data,
+                    encoded=encoded, encoded_format=self.encoded_format
+                )
+                if self.analyzer is not None:
+                    self.analyzer.submit(digest, data)
+                    if self._removals() != removals:
+                        removals = self._removals()
+                        self._prune_index()
+                self.generated += 1
+            else:
+                self.failures += 1
+                self._wake.wait(self.retry_seconds)
+
+    def stats(self):
+        return {
+            'pool_size': self.pool_size,
+            'generated': self.generated,
+            'failures': self.failures,
+            'running': self._thread is not None and self._thread.is_alive()
+        }
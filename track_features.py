@@ -0,0 +1,286 @@
+# track_features.py
+"""Audio-feature index over the tracks in the track cache.
+
+Every generated track is analyzed once with librosa (tempo, loudness and
+spectral shape) in a worker process. The results live in a small NumPy
+index saved next to the cache, so the music page can serve the ready track
+whose tempo is closest to the user's preferred BPM without analyzing
+anything on the request path. In the app, the index is saved at most every
+INDEX_SAVE_DELAY seconds rather than after each track, and rows for tracks
+the cache has evicted are pruned as the pool warmer stores new ones.
+
+Usage:
+    python track_features.py              # index every cached track not yet analyzed
+    python track_features.py --workers 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+
+from track_cache import TRACK_CACHE_DIR
+
+INDEX_PATH = TRACK_CACHE_DIR / "features.npz"
+ANALYSIS_WORKERS = int(os.environ.get("MUSICREC_ANALYSIS_WORKERS", 2))
+# Seconds the index may hold unsaved results; each save rewrites the whole file
+INDEX_SAVE_DELAY = float(os.environ.get("MUSICREC_INDEX_SAVE_DELAY", 30))
+# Tracks are analyzed at a reduced mono rate; plenty for tempo and spectral shape
+ANALYSIS_SAMPLE_RATE = 22050
+
+FEATURE_NAMES = ('tempo', 'loudness_db', 'spectral_centroid', 'spectral_bandwidth', 'spectral_rolloff')
+TEMPO = FEATURE_NAMES.index('tempo')
+
+
+def analyze_track(data):
+    """Compute the FEATURE_NAMES vector for one track (audio file bytes)."""
+    import librosa
+
+    y, sr = librosa.load(BytesIO(data), sr=ANALYSIS_SAMPLE_RATE, mono=True)
+    # One STFT shared by every spectral feature
+    S = np.abs(librosa.stft(y))
+    onset_envelope = librosa.onset.onset_strength(S=librosa.amplitude_to_db(S, ref=np.max), sr=sr)
+    tempo = librosa.feature.tempo(onset_envelope=onset_envelope, sr=sr)[0]
+    rms = librosa.feature.rms(S=S).mean()
+    return np.array([
+        tempo,
+        20 * np.log10(max(rms, 1e-10)),
+        librosa.feature.spectral_centroid(S=S, sr=sr).mean(),
+        librosa.feature.spectral_bandwidth(S=S, sr=sr).mean(),
+        librosa.feature.spectral_rolloff(S=S, sr=sr).mean()
+    ], dtype=np.float32)
+
+
+def tempo_distance(tempos, bpm):
+    """Distance from each tempo to a target BPM, forgiving half/double-time tempo estimates."""
+    tempos = np.asarray(tempos, dtype=np.float32)[:, None]
+    candidates = tempos * np.array([0.5, 1.0, 2.0], dtype=np.float32)
+    return np.abs(candidates - bpm).min(axis=1)
+
+
+class TrackFeatureIndex:
+    """Features of analyzed tracks, keyed by content digest and stored as one .npz file."""
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._digests = np.empty(0, dtype='U64')
+        self._features = np.empty((0, len(FEATURE_NAMES)), dtype=np.float32)
+        self._positions = {}
+        if self.path.exists():
+            self.load()
+
+    def load(self):
+        with np.load(self.path) as data:
+            digests, features = data['digests'], data['features']
+        with self._lock:
+            self._digests, self._features = digests, features
+            self._positions = {digest: i for i, digest in enumerate(digests.tolist())}
+
+    def save(self):
+        """Write the index atomically, so readers never load a partial file."""
+        with self._lock:
+            digests, features = self._digests, self._features
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{uuid.uuid4().hex}.npz")
+        np.savez(tmp, digests=digests, features=features)
+        os.replace(tmp, self.path)
+
+    def add(self, digests, features):
+        """Add (or replace) feature rows for a batch of track digests."""
+        features = np.asarray(features, dtype=np.float32).reshape(-1, len(FEATURE_NAMES))
+        with self._lock:
+            new = [i for i, digest in enumerate(digests) if digest not in self._positions]
+            for i, digest in enumerate(digests):
+                if digest in self._positions:
+                    self._features[self._positions[digest]] = features[i]
+            if new:
+                start = len(self._digests)
+                self._digests = np.concatenate([self._digests, np.array([digests[i] for i in new], dtype='U64')])
+                self._features = np.concatenate([self._features, features[new]])
+                for offset, i in enumerate(new):
+                    self._positions[digests[i]] = start + offset
+
+    def prune(self, live_digests):
+        """Drop rows for tracks that are no longer in the cache."""
+        live = set(live_digests)
+        with self._lock:
+            keep = np.array([digest in live for digest in self._digests.tolist()], dtype=bool)
+            self._digests, self._features = self._digests[keep], self._features[keep]
+            self._positions = {digest: i for i, digest in enumerate(self._digests.tolist())}
+            return int((~keep).sum())
+
+    def __contains__(self, digest):
+        return digest in self._positions
+
+    def __len__(self):
+        return len(self._digests)
+
+    def features(self, digests):
+        """Return (digests that are indexed, their feature rows)."""
+        with self._lock:
+            found = [digest for digest in digests if digest in self._positions]
+            rows = self._features[[self._positions[digest] for digest in found]]
+        return found, rows
+
+    def closest(self, bpm, digests, tolerance=None):
+        """Return the digest among `digests` whose tempo is closest to bpm, or None.
+
+        Args:
+            bpm (float): Target tempo
+            digests (list): Candidate track digests (e.g. a genre's ready tracks)
+            tolerance (float): Optional maximum tempo distance in BPM
+        """
+        found, rows = self.features(digests)
+        if not found:
+            return None
+        distances = tempo_distance(rows[:, TEMPO], bpm)
+        best = int(distances.argmin())
+        if tolerance is not None and distances[best] > tolerance:
+            return None
+        return found[best]
+
+
+def _analyze_file(path):
+    return analyze_track(Path(path).read_bytes())
+
+
+class TrackAnalyzer:
+    """Analyzes tracks in a process pool and records the results in an index.
+
+    Args:
+        index (TrackFeatureIndex): Where results are recorded
+        workers (int): Analysis worker processes
+        save_delay (float): Seconds to batch index changes from submit() and
+            prune() before saving them in one write
+    """
+
+    def __init__(self, index, workers=ANALYSIS_WORKERS, save_delay=INDEX_SAVE_DELAY):
+        self.index = index
+        self.workers = workers
+        self.save_delay = save_delay
+        self.analyzed = 0
+        self.failures = 0
+        self.saves = 0
+        self._executor = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._save_timer = None
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # Spawned, not forked: the Streamlit server process is multi-threaded
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def submit(self, digest, data):
+        """Queue one track (audio file bytes) for analysis without blocking."""
+        if digest in self.index:
+            return None
+        future = self._pool().submit(analyze_track, data)
+
+        def record(done):
+            try:
+                features = done.result()
+            except Exception:
+                self.failures += 1
+                return
+            self.index.add([digest], [features])
+            self.analyzed += 1
+            self._schedule_save()
+
+        future.add_done_callback(record)
+        return future
+
+    def prune(self, live_digests):
+        """Drop index rows for tracks no longer in the cache; saved with the next batch.
+
+        Returns:
+            int: Rows removed
+        """
+        removed = self.index.prune(live_digests)
+        if removed:
+            self._schedule_save()
+        return removed
+
+    def _schedule_save(self):
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.save_delay, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def flush(self):
+        """Save the index now if it changed since the last save."""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            dirty, self._dirty = self._dirty, False
+        if dirty:
+            self.index.save()
+            self.saves += 1
+
+    def analyze_paths(self, paths):
+        """Analyze a batch of track files and add them to the index in one save.
+
+        Returns:
+            int: Number of tracks analyzed
+        """
+        paths = [Path(p) for p in paths if Path(p).stem not in self.index]
+        digests, rows = [], []
+        for path, result in zip(paths, self._pool().map(_analyze_file, paths, chunksize=4)):
+            digests.append(path.stem)
+            rows.append(result)
+        if digests:
+            self.index.add(digests, np.stack(rows))
+            self.index.save()
+            self.analyzed += len(digests)
+        return len(digests)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+        self.flush()
+
+    def stats(self):
+        return {'indexed': len(self.index), 'analyzed': self.analyzed, 'failures': self.failures, 'saves': self.saves}
+
+
+def main():
+    from track_cache import TrackCache
+
+    parser = argparse.ArgumentParser(description="Analyze cached tracks into the audio-feature index.")
+    parser.add_argument("--cache", default=str(TRACK_CACHE_DIR), help="Track cache directory")
+    parser.add_argument("--index", default=None, help="Index file (default: features.npz in the cache)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Analysis worker processes")
+    args = parser.parse_args()
+
+    cache = TrackCache(args.cache)
+    index = TrackFeatureIndex(args.index or Path(args.cache) / "features.npz")
+    paths = cache.track_paths()
+    removed = index.prune(p.stem for p in paths)
+    analyzer = TrackAnalyzer(index, workers=args.workers)
+    try:
+        analyzed = analyzer.analyze_paths(paths)
+    finally:
+        analyzer.shutdown()
+    if removed and not analyzed:
+        index.save()
+    print(f"Analyzed {analyzed} tracks, pruned {removed}; index holds {len(index)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# tree_ensemble.py
+"""Dependency-free evaluator for the best_xgb tree ensemble.
+
+The export step flattens every tree of the XGBoost model into a handful of
+NumPy arrays (feature index, threshold, children, leaf value) saved as an
+.npz file. TreeEnsemble then scores batches with NumPy alone, so serving
+does not need to import xgboost.
+
+Usage:
+    python tree_ensemble.py best_xgb best_xgb.trees.npz
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+
+TREES_PATH = Path("best_xgb.trees.npz")
+
+# Rows evaluated per step; bounds the (rows x trees) node-index matrix
+CHUNK_ROWS = 4096
+
+
+class TreeEnsemble:
+    """Multi-class gradient-boosted tree ensemble evaluated with NumPy.
+
+    Nodes of all trees live in flat arrays. Leaves point to themselves, so
+    walking every tree for max_depth steps always ends on a leaf.
+    """
+
+    def __init__(self, feature, threshold, left, right, default_left, value,
+                 roots, tree_class, base_score, num_class, max_depth, version=""):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.value = value
+        self.roots = roots
+        self.tree_class = tree_class
+        self.base_score = base_score
+        self.num_class = int(num_class)
+        self.max_depth = int(max_depth)
+        self.version = version
+        # (trees, classes) one-hot matrix that sums leaf values into class margins
+        self._class_matrix = np.zeros((len(roots), self.num_class), dtype=np.float64)
+        self._class_matrix[np.arange(len(roots)), tree_class] = 1.0
+
+    @classmethod
+    def load(cls, path=TREES_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                feature=data["feature"],
+                threshold=data["threshold"],
+                left=data["left"],
+                right=data["right"],
+                default_left=data["default_left"],
+                value=data["value"],
+                roots=data["roots"],
+                tree_class=data["tree_class"],
+                base_score=data["base_score"],
+                num_class=int(data["num_class"]),
+                max_depth=int(data["max_depth"]),
+                version=str(data["version"])
+            )
+
+    def save(self, path=TREES_PATH):
+        np.savez_compressed(
+            path,
+            feature=self.feature,
+            threshold=self.threshold,
+            left=self.left,
+            right=self.right,
+            default_left=self.default_left,
+            value=self.value,
+            roots=self.roots,
+            tree_class=self.tree_class,
+            base_score=self.base_score,
+            num_class=np.int32(self.num_class),
+            max_depth=np.int32(self.max_depth),
+            version=np.str_(self.version)
+        )
+
+    def _leaves(self, features):
+        """Return the (rows, trees) leaf node index reached by each row in each tree."""
+        rows = np.arange(len(features))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(features), len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            x = features[rows, self.feature[nodes]]
+            go_left = np.where(np.isnan(x), self.default_left[nodes], x < self.threshold[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_margin(self, features):
+        """Return raw (rows, classes) margins for a float feature matrix."""
+        features = np.asarray(features, dtype=np.float32)
+        margins = np.empty((len(features), self.num_class), dtype=np.float64)
+        for start in range(0, len(features), CHUNK_ROWS):
+            chunk = features[start:start + CHUNK_ROWS]
+            leaf_values = self.value[self._leaves(chunk)].astype(np.float64)
+            margins[start:start + len(chunk)] = leaf_values @ self._class_matrix
+        return margins + self.base_score
+
+    def predict_proba(self, features):
+        margins = self.predict_margin(features)
+        margins -= margins.max(axis=1, keepdims=True)
+        np.exp(margins, out=margins)
+        margins /= margins.sum(axis=1, keepdims=True)
+        return margins.astype(np.float32)
+
+    def predict(self, features):
+        return self.predict_margin(features).argmax(axis=1)
+
+
+def _parse_base_score(text, num_class):
+    values = json.loads(text) if str(text).startswith('[') else [float(text)]
+    return np.broadcast_to(np.asarray(values, dtype=np.float64), (num_class,)).copy()
+
+
+def from_booster_json(model_json, version=""):
+    """Flatten XGBoost's JSON model dump into a TreeEnsemble."""
+    learner = model_json["learner"]
+    model = learner["gradient_booster"]["model"]
+    params = learner["learner_model_param"]
+    num_class = max(int(params.get("num_class", 1)), 1)
+
+    features, thresholds, lefts, rights, defaults, values, roots = [], [], [], [], [], [], []
+    max_depth = 0
+    offset = 0
+    for tree in model["trees"]:
+        left = np.asarray(tree["left_children"], dtype=np.int64)
+        right = np.asarray(tree["right_children"], dtype=np.int64)
+        if tree.get("categories_nodes"):
+            raise ValueError("Categorical splits are not supported by the NumPy evaluator")
+        is_leaf = left == -1
+        node_ids = np.arange(len(left))
+
+        # Leaves loop back to themselves; internal nodes get global child indices
+        features.append(np.where(is_leaf, 0, tree["split_indices"]).astype(np.int32))
+        thresholds.append(np.asarray(tree["split_conditions"], dtype=np.float32))
+        lefts.append(np.where(is_leaf, node_ids, left) + offset)
+        rights.append(np.where(is_leaf, node_ids, right) + offset)
+        defaults.append(np.asarray(tree["default_left"], dtype=bool))
+        # XGBoost stores leaf outputs in split_conditions
+        values.append(np.where(is_leaf, tree["split_conditions"], 0.0).astype(np.float32))
+        roots.append(offset)
+
+        depth = np.zeros(len(left), dtype=np.int64)
+        for node in node_ids:
+            if not is_leaf[node]:
+                depth[left[node]] = depth[right[node]] = depth[node] + 1
+        max_depth = max(max_depth, int(depth.max()))
+        offset += len(left)
+
+    tree_class = np.asarray(model["tree_info"], dtype=np.int32)
+    return TreeEnsemble(
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds),
+        left=np.concatenate(lefts).astype(np.int32),
+        right=np.concatenate(rights).astype(np.int32),
+        default_left=np.concatenate(defaults),
+        value=np.concatenate(values),
+        roots=np.asarray(roots, dtype=np.int32),
+        tree_class=tree_class,
+        base_score=_parse_base_score(params.get("base_score", "0.5"), num_class),
+        num_class=num_class,
+        max_depth=max_depth,
+        version=version
+    )
+
+
+def verification_grid(num_profiles=2000, num_random=2000, seed=0):
+    """Build an input grid from synthetic form profiles plus random rows with missing values."""
+    from features import FEATURE_ENCODER, random_profiles
+
+    profile_rows = FEATURE_ENCODER.encode(random_profiles(num_profiles, seed=seed))
+    rng = np.random.default_rng(seed)
+    low, high = profile_rows.min(axis=0) - 1, profile_rows.max(axis=0) + 1
+    random_rows = rng.uniform(low, high, (num_random, profile_rows.shape[1])).astype(np.float32)
+    random_rows[rng.random(random_rows.shape) < 0.05] = np.nan
+    return np.vstack([profile_rows, random_rows])
+
+
+def verify(ensemble, model, grid=None, atol=1e-5):
+    """Check the ensemble against the XGBoost model on a grid of inputs.
+
+    Raises:
+        ValueError: If any predicted class or probability differs
+    """
+    grid = verification_grid() if grid is None else grid
+    expected = np.asarray(model.predict_proba(grid))
+    actual = ensemble.predict_proba(grid)
+    if not np.allclose(actual, expected, atol=atol):
+        worst = float(np.abs(actual - expected).max())
+        raise ValueError(f"Probabilities differ from the XGBoost model (max abs diff {worst:.3g})")
+    mismatched = int((actual.argmax(axis=1) != np.asarray(model.predict(grid))).sum())
+    if mismatched:
+        raise ValueError(f"{mismatched} of {len(grid)} predictions differ from the XGBoost model")
+    return len(grid)
+
+
+def export(model_path, out_path=TREES_PATH):
+    """Flatten the model at model_path into an .npz and verify it against XGBoost."""
+    from model_registry import load_model_file
+
+    handle = load_model_file(model_path)
+    model_json = json.loads(bytes(handle.get_booster().save_raw(raw_format="json")))
+    ensemble = from_booster_json(model_json, version=handle.version)
+    checked = verify(ensemble, handle)
+    ensemble.save(out_path)
+    return ensemble, checked
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export best_xgb to NumPy tree arrays.")
+    parser.add_argument("model_path", nargs="?", default="best_xgb")
+    parser.add_argument("out_path", nargs="?", default=str(TREES_PATH))
+    args = parser.parse_args()
+
+    ensemble, checked = export(args.model_path, args.out_path)
+    print(f"Exported {len(ensemble.roots)} trees ({len(ensemble.value)} nodes, depth {ensemble.max_depth}) "
+          f"to {args.out_path}; verified on {checked} rows.")
+
+
+if __name__ == "__main__":
+    main()